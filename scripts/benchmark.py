@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+"""
+Performance benchmarks: ray tracing throughput and optimization wall time
+
+usage:
+    python scripts/benchmark.py                        # run and print results
+    python scripts/benchmark.py --save baseline.json   # run and store a baseline
+    python scripts/benchmark.py --compare baseline.json [--threshold 0.2]
+
+Benchmarks:
+    import/torchlensmaker          wall time of 'import torchlensmaker' in a new process, in s
+    collide/<shape>/<rays>         collide() throughput of each shape, in rays/s
+    forward_backward/<system>      forward and backward pass of an example system, in s
+    optimize/<system>              tlm.optimize() iterations per second
+
+Baselines are only meaningful on the machine they were recorded on, so
+record one with --save before making changes, then compare against it. The
+comparison mode exits with status 1 if any benchmark is slower than its
+baseline by more than the threshold (relative).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+import torchlensmaker as tlm
+from torchlensmaker.raytracing import rays_to_coefficients
+
+
+# Optical systems of the example notebooks, with their initial (non optimized)
+# parameters. Each function returns a tuple (optics, sampling).
+
+
+def biconvex_parabola():
+    "examples/Biconvex lens parabola.ipynb"
+
+    shape = tlm.Parabola(height=15., a=nn.Parameter(torch.tensor(0.005)))
+    lens = tlm.SymmetricLens(shape, (1.0, 1.49), outer_thickness=0.5)
+
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=20),
+        tlm.Gap(10.),
+        lens,
+        tlm.Gap(45.0),
+        tlm.FocalPoint(),
+    )
+
+    return optics, {"rays": 10}
+
+
+def aperture():
+    "examples/Aperture.ipynb"
+
+    shape = tlm.Parabola(height=50., a=nn.Parameter(torch.tensor(0.005)))
+    lens = tlm.SymmetricLens(shape, (1.0, 1.49), outer_thickness=0.5)
+
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=50),
+        tlm.Gap(10.),
+        lens,
+        tlm.Gap(10.0),
+        tlm.Aperture(height=50, diameter=20),
+        tlm.Gap(45.0),
+        tlm.FocalPoint(),
+    )
+
+    return optics, {"rays": 10}
+
+
+def triple_biconvex():
+    "examples/Triple Biconvex lens parabola.ipynb"
+
+    lens_width = 15.0
+    shape = tlm.Parabola(lens_width, a=nn.Parameter(torch.tensor(-0.005)))
+
+    surface1 = tlm.RefractiveSurface(shape, (1.0, 1.49), anchors=("origin", "extent"))
+    surface2 = tlm.RefractiveSurface(shape, (1.49, 1.0), scale=-1, anchors=("extent", "origin"))
+
+    lens = [surface1, tlm.Gap(5.0), surface2]
+
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=0.9*lens_width),
+        tlm.Gap(15.),
+        *lens,
+        tlm.Gap(5.),
+        *lens,
+        tlm.Gap(5.),
+        *lens,
+        tlm.Gap(80.),
+        tlm.FocalPoint(),
+    )
+
+    return optics, {"rays": 10}
+
+
+def reflecting_telescope():
+    "examples/Reflecting Telescope.ipynb"
+
+    shape_primary = tlm.Parabola(height=35., a=nn.Parameter(torch.tensor(-0.0001)))
+    shape_secondary = tlm.CircularArc(height=35., r=nn.Parameter(torch.tensor(450.0)))
+
+    optics = tlm.OpticalSequence(
+        tlm.Gap(-100),
+        tlm.PointSourceAtInfinity(beam_diameter=30),
+        tlm.Gap(100),
+        tlm.ReflectiveSurface(shape_primary),
+        tlm.Gap(-80),
+        tlm.ReflectiveSurface(shape_secondary),
+        tlm.Gap(100),
+        tlm.FocalPoint(),
+    )
+
+    return optics, {"rays": 10}
+
+
+def landscape_singlet():
+    "examples/landscape_singlet_lens.ipynb (with aperture)"
+
+    shape1 = tlm.CircularArc(height=30, r=tlm.Parameter(torch.tensor(25.)))
+    shape2 = tlm.CircularArc(height=30, r=tlm.Parameter(torch.tensor(65.)))
+
+    lens = tlm.AsymmetricLens(shape1, shape2, (1.0, 1.5), outer_thickness=3.)
+
+    optics = tlm.OpticalSequence(
+        tlm.ObjectAtInfinity(beam_diameter=40, angular_size=40),
+        tlm.Gap(15),
+        lens,
+        tlm.Gap(20),
+        tlm.Aperture(height=50, diameter=10),
+        tlm.Gap(100),
+        tlm.ImagePlane(height=100),
+    )
+
+    return optics, {"rays": 10, "object": 10}
+
+
+all_systems = {
+    "biconvex_parabola": biconvex_parabola,
+    "aperture": aperture,
+    "triple_biconvex": triple_biconvex,
+    "reflecting_telescope": reflecting_telescope,
+    "landscape_singlet": landscape_singlet,
+}
+
+
+shapes = {
+    "Parabola": lambda: tlm.Parabola(height=30., a=0.02),
+    "CircularArc": lambda: tlm.CircularArc(height=30., r=40.),
+    "BezierSpline": lambda: tlm.BezierSpline(height=30., X=[2.11], CX=[3.35], CY=[4.91, 19.54]),
+    "PiecewiseLine": lambda: tlm.PiecewiseLine(30., X=torch.linspace(0.0, 2.0, 10)),
+}
+
+systems = ["triple_biconvex", "reflecting_telescope", "landscape_singlet"]
+
+learning_rates = {
+    "triple_biconvex": 5e-4,
+    "reflecting_telescope": 2e-4,
+    "landscape_singlet": 1e-4,
+}
+
+
+def timeit(function, repeat):
+    "Median wall time of function() over repeat calls, after one warmup call"
+
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_import(repeat):
+    "Startup time of a new process importing the package"
+
+    run = lambda: subprocess.run([sys.executable, "-c", "import torchlensmaker"], check=True)
+    baseline = timeit(lambda: subprocess.run([sys.executable, "-c", "pass"], check=True), repeat)
+    return timeit(run, repeat) - baseline
+
+
+def bench_collide(name, num_rays, repeat):
+    shape = shapes[name]()
+
+    # Rays parallel to the principal axis across 90% of the shape height
+    Y = torch.linspace(-0.45 * 30., 0.45 * 30., num_rays)
+    points = torch.column_stack((torch.full((num_rays,), -10.), Y))
+    directions = torch.tile(torch.tensor([1., 0.]), (num_rays, 1))
+    lines = rays_to_coefficients(points, directions)
+
+    with torch.no_grad():
+        elapsed = timeit(lambda: shape.collide(lines), repeat)
+    return num_rays / elapsed
+
+
+def bench_forward_backward(name, repeat):
+    optics, sampling = all_systems[name]()
+
+    def step():
+        optics.zero_grad()
+        loss = optics(tlm.default_input, sampling).loss
+        loss.backward()
+
+    return timeit(step, repeat)
+
+
+def bench_optimize(name, num_iter):
+    optics, sampling = all_systems[name]()
+    optimizer = optim.Adam(optics.parameters(), lr=learning_rates[name])
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tlm.optimize(optics, optimizer, sampling, num_iter)
+    return num_iter / (time.perf_counter() - start)
+
+
+def run(args):
+    results = {}
+
+    def record(key, value, unit, higher_is_better):
+        results[key] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{key:<40} {value:>14.4g} {unit}", flush=True)
+
+    record("import/torchlensmaker", bench_import(min(args.repeat, 5)), "s", False)
+
+    for name in shapes:
+        for num_rays in args.rays:
+            record(f"collide/{name}/{num_rays}", bench_collide(name, num_rays, args.repeat), "rays/s", True)
+
+    for name in systems:
+        record(f"forward_backward/{name}", bench_forward_backward(name, args.repeat), "s", False)
+
+    for name in systems:
+        record(f"optimize/{name}", bench_optimize(name, args.iterations), "it/s", True)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    "Print the relative change of each benchmark, and return the list of regressions"
+
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, current in results.items():
+        if key not in baseline:
+            print(f"{key:<40} {'-':>12} {current['value']:>12.4g}      new")
+            continue
+
+        before, after = baseline[key]["value"], current["value"]
+
+        # Slowdown as a positive relative number, whatever the unit
+        slowdown = (before - after) / before if current["higher_is_better"] else (after - before) / before
+        flag = "  SLOWER" if slowdown > threshold else ""
+        print(f"{key:<40} {before:>12.4g} {after:>12.4g} {-slowdown:>+8.1%}{flag}")
+
+        if slowdown > threshold:
+            regressions.append(key)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", metavar="PATH", help="store results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare results with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    parser.add_argument("--rays", type=int, nargs="+", default=[1000, 10000, 100000], help="ray counts for collide benchmarks")
+    parser.add_argument("--repeat", type=int, default=20, help="number of timed repetitions")
+    parser.add_argument("--iterations", type=int, default=50, help="number of optimize iterations")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    results = run(args)
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "torch": torch.__version__,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "threads": torch.get_num_threads(),
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+Compare tlm.cmaes() with gradient descent on the example notebooks' designs
+
+usage: python scripts/benchmark_cmaes.py [--generations 50] [--iterations 100] [--workers 1]
+
+For each design, reports the final loss, wall time and number of forward
+evaluations of both optimizers. Each Adam iteration is one forward and one
+backward pass, each CMA-ES generation is popsize forward passes without
+autograd, so the evaluation counts differ and are reported side by side.
+"""
+
+import argparse
+import time
+
+import torch
+import torch.optim as optim
+
+import torchlensmaker as tlm
+from torchlensmaker.evolution import evaluate_loss
+
+from benchmark import all_systems
+
+
+learning_rates = {
+    "biconvex_parabola": 1e-3,
+    "aperture": 1e-3,
+    "triple_biconvex": 5e-4,
+    "reflecting_telescope": 2e-4,
+    "landscape_singlet": 1e-4,
+}
+
+
+def run_adam(build, lr, num_iter):
+    optics, sampling = build()
+    optimizer = optim.Adam(optics.parameters(), lr=lr)
+
+    start = time.perf_counter()
+    for _ in range(num_iter):
+        optimizer.zero_grad()
+        loss = evaluate_loss(optics, sampling)
+        loss.backward()
+        optimizer.step()
+    elapsed = time.perf_counter() - start
+
+    with torch.no_grad():
+        final = evaluate_loss(optics, sampling).item()
+    return final, elapsed, num_iter
+
+
+def run_cmaes(build, num_generations, sigma, workers):
+    optics, sampling = build()
+
+    # Scale the search distribution to the magnitude of each parameter
+    sigma = {n: sigma * max(p.detach().abs().max().item(), 1e-3) for n, p in optics.named_parameters()}
+
+    start = time.perf_counter()
+    record = tlm.cmaes(optics, sampling, num_generations, sigma=sigma, seed=0, nshow=1, workers=workers)
+    elapsed = time.perf_counter() - start
+
+    return record.best_loss, elapsed, record.num_evaluations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generations", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--sigma", type=float, default=0.2, help="relative initial step size")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes evaluating CMA-ES generations")
+    args = parser.parse_args()
+
+    print(
+        f"{'design':<22} {'adam loss':>12} {'adam time':>10} {'adam evals':>11}"
+        f" {'cmaes loss':>12} {'cmaes time':>11} {'cmaes evals':>12}"
+    )
+    for name, build in all_systems.items():
+        adam_loss, adam_time, adam_evals = run_adam(build, learning_rates[name], args.iterations)
+        cmaes_loss, cmaes_time, cmaes_evals = run_cmaes(build, args.generations, args.sigma, args.workers)
+        print(
+            f"{name:<22} {adam_loss:>12.4g} {adam_time:>9.2f}s {adam_evals:>11}"
+            f" {cmaes_loss:>12.4g} {cmaes_time:>10.2f}s {cmaes_evals:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
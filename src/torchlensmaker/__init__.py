@@ -11,6 +11,16 @@ from torchlensmaker.optics import (
     ObjectAtInfinity,
     Image,
     ImagePlane,
+    half_pupil,
+)
+
+from torchlensmaker.materials import (
+    Material,
+    NonDispersiveMaterial,
+    CauchyMaterial,
+    SellmeierMaterial,
+    materials_table,
+    default_wavelength,
 )
 
 from torchlensmaker.shapes import (
@@ -22,20 +32,83 @@ from torchlensmaker.shapes import (
     PiecewiseLine,
 )
 
-from torchlensmaker.training import (
-    optimize,
+from torchlensmaker.optimization import (
+    OptimizationRecord,
+    run_optimization,
+)
+
+from torchlensmaker.checkpoint import (
+    CheckpointWriter,
+    load_checkpoint,
+)
+
+from torchlensmaker.evolution import (
+    CMAES,
+    cmaes,
+)
+
+from torchlensmaker.tolerancing import (
+    Tolerance,
+    tolerance,
+)
+
+from torchlensmaker.sensitivity import (
+    Sensitivity,
+    jacobian,
+)
+
+from torchlensmaker.parallel import (
+    SystemPool,
+)
+
+from torchlensmaker.serialization import (
+    save_system,
+    load_system,
+)
+
+from torchlensmaker.sweep import (
+    sweep,
+    load_sweep,
+)
+
+from torchlensmaker.paraxial import (
+    ParaxialSystem,
+    paraxial,
+)
+
+from torchlensmaker.seidel import (
+    SeidelSums,
+    seidel,
+)
+
+from torchlensmaker.aiming import (
+    aim_rays,
+)
+
+from torchlensmaker.layout import (
+    ElementLayout,
+    stack_layout,
+    clear_layout_cache,
+)
+
+from torchlensmaker.plan import (
+    ExecutionPlan,
+    compile_plan,
 )
 
-from torchlensmaker.export3d import (
-    lens_to_part,
+from torchlensmaker.recorder import (
+    TraceRecorder,
+)
+
+from torchlensmaker.profiling import (
+    ElementProfile,
+    Profiler,
 )
 
 from torchlensmaker.surface import (
     Surface,
 )
 
-from torchlensmaker.render_plt import render_plt
-
 from torchlensmaker.module import Module
 
 from torchlensmaker.lenses import (
@@ -46,8 +119,64 @@ from torchlensmaker.lenses import (
 
 from torchlensmaker.torch_extensions import (
     full_forward,
+    flatten_sequence,
+    is_axisymmetric,
+    freeze,
+    unfreeze,
     OpticalSequence,
     Parameter,
 )
 
-from torchlensmaker.plot_magnification import plot_magnification
+from torchlensmaker.spot import (
+    SpotData,
+    spot_diagram,
+)
+
+from torchlensmaker.focus import (
+    ThroughFocus,
+    through_focus,
+)
+
+from torchlensmaker.mtf import (
+    MTFData,
+    geometric_mtf,
+)
+
+from torchlensmaker.imaging import (
+    SimulatedImage,
+    simulate_image,
+)
+
+from torchlensmaker.config import (
+    load_config,
+    build_system,
+)
+
+# Plotting, training and CAD export functions depend on matplotlib and
+# build123d, which are slow to import. They are imported on first use
+# (PEP 562), so that processes that only trace rays don't pay for them.
+_lazy_exports = {
+    "optimize": "torchlensmaker.training",
+    "lens_to_part": "torchlensmaker.export3d",
+    "render_plt": "torchlensmaker.render_plt",
+    "plot_magnification": "torchlensmaker.plot_magnification",
+    "plot_spot_diagram": "torchlensmaker.plot_spot",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_exports:
+        import importlib
+
+        value = getattr(importlib.import_module(_lazy_exports[name]), name)
+
+        # Cache the function, also replacing the submodule attribute set by
+        # the import system when the module and function names are the same
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy_exports))
@@ -0,0 +1,171 @@
+import torch
+
+from dataclasses import replace
+
+from torchlensmaker.optics import (
+    Aperture,
+    PointSource,
+    PointSourceAtInfinity,
+    ObjectAtInfinity,
+    default_input,
+)
+from torchlensmaker.torch_extensions import flatten_sequence
+from torchlensmaker.raytracing import ray_plane_intersection
+
+
+def stop_grid(num_rays, radius):
+    "Uniform grid of num_rays cell centers across a stop of the given radius"
+
+    return radius * ((torch.arange(num_rays) + 0.5) / num_rays * 2 - 1)
+
+
+def trace_to_stop(elements, source, stop, aim, sampling):
+    """
+    Trace the rays of a light source with the given aim up to the plane of
+    the stop, through the partial system elements[:stop]
+
+    Returns: (index, height)
+        index: index in aim.flatten() of the rays reaching the stop plane
+        height: height of those rays on the stop plane, relative to its center
+    """
+
+    inputs = default_input
+    for element in elements[:source]:
+        inputs = element(inputs, sampling)
+
+    # Track rays of the aimed source with an index column, -1 for other rays
+    num_before = inputs.rays.shape[0]
+    elements[source].aim = aim
+    inputs = elements[source](inputs, sampling)
+    index = torch.cat((torch.full((num_before,), -1), torch.arange(inputs.rays.shape[0] - num_before)))
+    inputs = replace(inputs, rays=inputs.rays.update(index=index.to(dtype=inputs.rays.data.dtype)))
+
+    for element in elements[source + 1 : stop]:
+        inputs = element(inputs, sampling)
+
+    rays = inputs.rays.masked(inputs.rays.get("index") >= 0)
+    height = ray_plane_intersection(rays.get(["RX", "RY"]), rays.get(["VX", "VY"]), inputs.target[0])
+
+    return rays.get("index").to(dtype=torch.long), height - inputs.target[1]
+
+
+def aim_rays(optics, sampling, iterations=10, tol=1e-5):
+    """
+    Aim the rays of light sources so that they fill the aperture stop uniformly
+
+    By default, light sources sample their beam without knowing where the
+    aperture stop is, so many rays can be blocked and the stop is unevenly
+    sampled. This finds, for each light source before the first Aperture of
+    the stack, the ray heights (or angles for a PointSource) that land on a
+    uniform grid across the stop. It solves with batched Newton iterations on
+    the partial system up to the stop: each ray only depends on its own
+    sample, so the derivatives of all rays are obtained with a single
+    backward pass. When a step makes a ray blocked before the stop, the ray
+    is bisected back toward its best aim so far. Rays that never reached the
+    stop restart from the aim of the nearest ray of the same beam that did.
+    The best aim of each ray is kept.
+
+    The solution is stored in the 'aim' attribute of the light sources and
+    used by their forward until it's reset to None. It depends on the
+    parameters of the elements before the stop, so it should be updated
+    after they change, for example every few optimization steps. Aiming is
+    done for the center wavelength, with sampling["rays"] rays, and with the
+    full pupil, but the result can be used with symmetry sampling.
+
+    Args:
+        optics: optical stack containing an Aperture
+        sampling: sampling dict the stack will be evaluated with
+        iterations: maximum number of Newton iterations
+        tol: convergence tolerance on the ray heights, relative to the stop radius
+
+    Returns:
+        largest distance of an aimed ray to its target on the stop, relative to
+        the stop radius (inf if some rays never reached the stop). Targets
+        that can't be reached, for example because the stop is vignetted by
+        the rim of a lens, give a finite error larger than tol.
+    """
+
+    elements = flatten_sequence(optics)
+
+    stops = [i for i, element in enumerate(elements) if isinstance(element, Aperture)]
+    if len(stops) == 0:
+        raise ValueError("aim_rays() needs an Aperture in the optical stack")
+    stop = stops[0]
+
+    sources = [
+        i for i, element in enumerate(elements[:stop])
+        if isinstance(element, (PointSource, PointSourceAtInfinity, ObjectAtInfinity))
+    ]
+
+    sampling = dict(sampling, wavelength=1, symmetry=False)
+    radius = torch.as_tensor(elements[stop].diameter / 2, dtype=torch.float32)
+    num_rays = sampling["rays"]
+    error = torch.tensor(0.)
+
+    for source in sources:
+        element = elements[source]
+        element.aim = None
+        aim = element.samples(sampling).detach().contiguous()
+        target = stop_grid(num_rays, radius).expand_as(aim).flatten()
+
+        # Each ray only depends on its own aim, so the best aim is tracked per ray:
+        # the aim with the smallest residual among the aims that reached the stop
+        best = aim.flatten().clone()
+        best_residual = torch.full((aim.numel(),), float("inf"))
+
+        for _ in range(iterations + 1):
+            u = aim.flatten().clone().requires_grad_(True)
+
+            with torch.enable_grad():
+                index, height = trace_to_stop(elements, source, stop, u.view(aim.shape), sampling)
+                if height.numel() > 0:
+                    (grad,) = torch.autograd.grad(height.sum(), u)
+
+            if height.numel() == 0:
+                if bool(torch.isinf(best_residual).all()):
+                    element.aim = None
+                    raise RuntimeError("aim_rays(): no ray of the light source reaches the stop")
+                grad = torch.zeros_like(u)
+
+            residual = height.detach() - target[index]
+            derivative = grad[index]
+
+            reached = torch.zeros(u.shape[0], dtype=torch.bool)
+            reached[index] = True
+
+            improved = torch.abs(residual) < best_residual[index]
+            best[index] = torch.where(improved, u.detach()[index], best[index])
+            best_residual[index] = torch.where(improved, torch.abs(residual), best_residual[index])
+
+            if bool(torch.all(best_residual <= tol * radius)):
+                break
+
+            # Newton step for rays reaching the stop
+            new = u.detach().clone()
+            step = torch.where(derivative != 0, residual / derivative, torch.zeros_like(residual))
+            new[index] = new[index] - step
+
+            # Blocked rays bisect back toward their best aim, which reached the stop.
+            # Rays that never reached it restart from the best aim of the nearest ray
+            # of the same beam that did, which has the nearest target because targets are sorted.
+            has_best = torch.isfinite(best_residual)
+            positions = torch.arange(num_rays)
+            distance = torch.abs(positions[:, None] - positions[None, :]).expand(aim.numel() // num_rays, -1, -1)
+            distance = torch.where(has_best.view(-1, 1, num_rays), distance, num_rays)
+            nearest = best.view(-1, num_rays).gather(1, distance.argmin(dim=2)).flatten()
+            row_has_best = has_best.view(-1, num_rays).any(dim=1, keepdim=True).expand(-1, num_rays).flatten()
+
+            new = torch.where(
+                reached,
+                new,
+                torch.where(has_best, 0.5 * (u.detach() + best), torch.where(row_has_best, nearest, u.detach())),
+            )
+
+            aim = new.view(aim.shape)
+
+        # Keep the best aim of each ray. Rays whose target can't be reached,
+        # for example because of vignetting, are left at their closest aim.
+        element.aim = best.view(aim.shape)
+        error = torch.maximum(error, best_residual.max() / radius)
+
+    return error
@@ -0,0 +1,83 @@
+import os
+import torch
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def snapshot(value):
+    "Copy of a nested structure of dicts, lists and tensors, with tensors detached and cloned"
+
+    if isinstance(value, torch.Tensor):
+        return value.detach().clone()
+    elif isinstance(value, dict):
+        return {k: snapshot(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return type(value)(snapshot(v) for v in value)
+    else:
+        return value
+
+
+def rng_state():
+    "State of the torch random number generators"
+
+    state = {"cpu": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["cpu"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def load_checkpoint(path):
+    "Load a checkpoint written by CheckpointWriter, only load files you trust"
+
+    return torch.load(path, weights_only=False)
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints to a file on a background thread
+
+    save() takes a copy of the state and returns immediately, the copy is
+    then serialized by a background thread. Files are written to a temporary
+    path and renamed, so that the checkpoint on disk is always complete even
+    if the process is killed while writing. If the previous write is still
+    running when save() is called, save() waits for it, so that checkpoints
+    are written in order.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+
+    def write(self, state):
+        tmp = self.path + ".tmp"
+        torch.save(state, tmp)
+        os.replace(tmp, self.path)
+
+    def save(self, state):
+        state = snapshot(state)
+        self.wait()
+        self.pending = self.executor.submit(self.write, state)
+
+    def wait(self):
+        "Wait for the pending write, raising its error if it failed"
+
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            pending.result()
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,150 @@
+"""
+Command line interface
+
+usage:
+    torchlensmaker optimize CONFIG [CONFIG ...] [--output DIR] [--workers N]
+                            [--checkpoint-every N] [--resume]
+
+Each config file (JSON or YAML, see torchlensmaker.config) describes an
+optical system, its sampling, optimizer and regularization. Optimization
+runs headless, and results are written to DIR/<config name>/results.json.
+With --checkpoint-every, progress is checkpointed to
+DIR/<config name>/checkpoint.pt, and --resume continues interrupted jobs from
+their checkpoint.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+def output_metrics(optics, sampling):
+    "Final loss and RMS spot size of an optical stack"
+
+    import torch
+    import torchlensmaker as tlm
+
+    with torch.no_grad():
+        outputs = optics(tlm.default_input, sampling)
+        metrics = {"loss": outputs.loss.item(), "rays": outputs.rays.shape[0]}
+        if outputs.rays.shape[0] > 0:
+            metrics["rms"] = tlm.spot_diagram(outputs).rms.max().item()
+
+    return metrics
+
+
+def run_config(path, output_dir, nshow=0, checkpoint_every=0, resume=False):
+    """
+    Optimize the system of a config file and write the results
+
+    Args:
+        checkpoint_every: checkpoint period in iterations, or 0 for none
+        resume: continue from the job checkpoint, if there is one
+
+    Returns:
+        path of the results file
+    """
+
+    import torch
+    from torchlensmaker.config import load_config, build_system, build_optimizer, build_regularization
+    from torchlensmaker.optimization import run_optimization
+
+    config = load_config(path)
+    if "seed" in config:
+        torch.manual_seed(config["seed"])
+
+    optics, sampling = build_system(config)
+    optimizer, num_iter = build_optimizer(config, optics)
+    regularization = build_regularization(config)
+
+    name = os.path.splitext(os.path.basename(str(path)))[0]
+    job_dir = os.path.join(output_dir, name)
+    os.makedirs(job_dir, exist_ok=True)
+
+    checkpoint_path = os.path.join(job_dir, "checkpoint.pt")
+    checkpoint = checkpoint_path if checkpoint_every > 0 else None
+    resume_from = checkpoint_path if resume and os.path.exists(checkpoint_path) else None
+
+    start = time.perf_counter()
+    record = run_optimization(
+        optics,
+        optimizer,
+        sampling,
+        num_iter,
+        nshow=nshow,
+        regularization=regularization,
+        checkpoint=checkpoint,
+        checkpoint_every=checkpoint_every,
+        resume=resume_from,
+    )
+    elapsed = time.perf_counter() - start
+
+    results = {
+        "config": str(path),
+        "elapsed": elapsed,
+        "parameters": {n: p.detach().tolist() for n, p in optics.named_parameters()},
+        "loss_history": record.loss.tolist(),
+        "metrics": output_metrics(optics, sampling),
+    }
+
+    results_path = os.path.join(job_dir, "results.json")
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    return results_path
+
+
+def run_job(args):
+    "Run one config file, returning (path, results path or None, error message or None)"
+
+    path, output_dir, nshow, checkpoint_every, resume = args
+    try:
+        return path, run_config(path, output_dir, nshow, checkpoint_every, resume), None
+    except Exception:
+        return path, None, traceback.format_exc()
+
+
+def optimize_command(args):
+    jobs = [(path, args.output, args.nshow, args.checkpoint_every, args.resume) for path in args.configs]
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(run_job, jobs))
+    else:
+        results = [run_job(job) for job in jobs]
+
+    failed = 0
+    for path, results_path, error in results:
+        if error is None:
+            print(f"{path}: {results_path}")
+        else:
+            failed += 1
+            print(f"{path}: FAILED\n{error}", file=sys.stderr)
+
+    return 1 if failed > 0 else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="torchlensmaker", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    optimize = subparsers.add_parser("optimize", help="optimize systems described by config files")
+    optimize.add_argument("configs", nargs="+", help="JSON or YAML config files")
+    optimize.add_argument("--output", "-o", default="results", help="output directory (default: results)")
+    optimize.add_argument("--workers", "-j", type=int, default=1, help="number of worker processes (default: 1)")
+    optimize.add_argument("--nshow", type=int, default=0, help="number of progress lines printed per job (default: 0)")
+    optimize.add_argument("--checkpoint-every", type=int, default=0, help="checkpoint period in iterations, 0 to disable (default: 0)")
+    optimize.add_argument("--resume", action="store_true", help="resume jobs from their checkpoint if there is one")
+    optimize.set_defaults(func=optimize_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
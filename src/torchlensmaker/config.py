@@ -0,0 +1,194 @@
+import copy
+import json
+import torch
+import torch.nn as nn
+
+import torchlensmaker as tlm
+
+
+# Declarative description of optical systems
+#
+# A config is a dict (typically loaded from a JSON or YAML file) such as:
+#
+# {
+#     "system": [
+#         {"type": "PointSourceAtInfinity", "beam_diameter": 10},
+#         {"type": "Gap", "offset": 5},
+#         {"type": "SymmetricLens", "name": "lens", "n": [1.0, "BK7"], "outer_thickness": 1.0,
+#          "shape": {"type": "Parabola", "height": 15, "a": {"param": 0.02}}},
+#         {"type": "Gap", "offset": {"param": 45.0}},
+#         {"type": "FocalPoint"}
+#     ],
+#     "sampling": {"rays": 10},
+#     "optimizer": {"type": "Adam", "lr": 1e-3, "num_iter": 100},
+#     "regularization": [
+#         {"type": "inner_thickness", "element": "lens", "target": 1.5, "weight": 1.0}
+#     ],
+#     "seed": 0
+# }
+#
+# Values of the form {"param": value} become nn.Parameter, lists become tensors
+# (except for the 'n', 'anchors' and 'wavelength' arguments which are tuples).
+# Elements can be named with the 'name' key, otherwise they are named by
+# their index in the system list.
+
+
+element_types = {
+    "PointSource": tlm.PointSource,
+    "PointSourceAtInfinity": tlm.PointSourceAtInfinity,
+    "ObjectAtInfinity": tlm.ObjectAtInfinity,
+    "Gap": tlm.Gap,
+    "Aperture": tlm.Aperture,
+    "RefractiveSurface": tlm.RefractiveSurface,
+    "ReflectiveSurface": tlm.ReflectiveSurface,
+    "SymmetricLens": tlm.SymmetricLens,
+    "AsymmetricLens": tlm.AsymmetricLens,
+    "PlanoLens": tlm.PlanoLens,
+    "FocalPoint": tlm.FocalPoint,
+    "Image": tlm.Image,
+    "ImagePlane": tlm.ImagePlane,
+}
+
+shape_types = {
+    "Parabola": tlm.Parabola,
+    "CircularArc": tlm.CircularArc,
+    "BezierSpline": tlm.BezierSpline,
+    "PiecewiseLine": tlm.PiecewiseLine,
+    "Line": tlm.Line,
+}
+
+tuple_arguments = ("n", "anchors", "wavelength")
+
+
+def load_config(path):
+    "Load a config file, in JSON or YAML format (YAML requires PyYAML)"
+
+    path = str(path)
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to read YAML config files, install it with 'pip install pyyaml'")
+            return yaml.safe_load(f)
+        else:
+            return json.load(f)
+
+
+def parse_value(value):
+    "Convert a config value to a python value, tensor or parameter"
+
+    if isinstance(value, dict) and set(value.keys()) == {"param"}:
+        return nn.Parameter(torch.as_tensor(value["param"], dtype=torch.float32))
+    elif isinstance(value, list) and all(isinstance(v, (int, float)) for v in value):
+        return torch.as_tensor(value, dtype=torch.float32)
+    else:
+        return value
+
+
+def get_type(types, config, kind):
+    try:
+        return types[config["type"]]
+    except KeyError:
+        raise ValueError(f"Invalid {kind} config {config}, 'type' must be one of {list(types.keys())}")
+
+
+def build_shape(config):
+    "Build a shape from its config"
+
+    cls = get_type(shape_types, config, "shape")
+    kwargs = {k: parse_value(v) for k, v in config.items() if k != "type"}
+    return cls(**kwargs)
+
+
+def build_element(config):
+    "Build an optical element from its config"
+
+    cls = get_type(element_types, config, "element")
+
+    kwargs = {}
+    for key, value in config.items():
+        if key in ("type", "name"):
+            continue
+        elif key in ("shape", "shape1", "shape2"):
+            kwargs[key] = build_shape(value)
+        elif key in tuple_arguments and isinstance(value, list):
+            kwargs[key] = tuple(parse_value(v) for v in value)
+        else:
+            kwargs[key] = parse_value(value)
+
+    return cls(**kwargs)
+
+
+def build_system(config):
+    """
+    Build an optical stack from a config dict
+
+    Returns:
+        (optics, sampling): an OpticalSequence whose elements are named after
+        their 'name' key or index, and the sampling dict
+    """
+
+    elements = {}
+    for i, element_config in enumerate(config["system"]):
+        name = str(element_config.get("name", i))
+        if name in elements:
+            raise ValueError(f"Duplicate element name '{name}'")
+        elements[name] = build_element(element_config)
+
+    optics = tlm.OpticalSequence()
+    for name, element in elements.items():
+        optics.add_module(name, element)
+
+    # Keep the description of the system, so that it can be saved as config plus state dict
+    optics.config = copy.deepcopy(config)
+
+    return optics, dict(config.get("sampling", {"rays": 10}))
+
+
+def thickness_term(config, method):
+    "Squared distance of a lens thickness to its target"
+
+    name, target, weight = str(config["element"]), config["target"], config.get("weight", 1.0)
+
+    def term(optics):
+        lens = optics.get_submodule(name)
+        return weight * (getattr(lens, method)() - target) ** 2
+
+    return term
+
+
+regularization_types = {
+    "inner_thickness": lambda config: thickness_term(config, "inner_thickness"),
+    "outer_thickness": lambda config: thickness_term(config, "outer_thickness"),
+}
+
+
+def build_regularization(config):
+    "Regularization function optics -> loss term from the config, or None"
+
+    terms = [get_type(regularization_types, c, "regularization")(c) for c in config.get("regularization", [])]
+    if len(terms) == 0:
+        return None
+
+    return lambda optics: sum(term(optics) for term in terms)
+
+
+def build_optimizer(config, optics):
+    """
+    Torch optimizer from the config
+
+    Returns:
+        (optimizer, num_iter)
+    """
+
+    options = dict(config.get("optimizer", {"type": "Adam"}))
+    name = options.pop("type", "Adam")
+    num_iter = options.pop("num_iter", 100)
+
+    try:
+        cls = getattr(torch.optim, name)
+    except AttributeError:
+        raise ValueError(f"Unknown torch optimizer '{name}'")
+
+    return cls(optics.parameters(), **options), num_iter
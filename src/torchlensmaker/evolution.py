@@ -0,0 +1,327 @@
+import math
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.optics import default_input
+
+
+def select_parameters(optics, names=None):
+    """
+    List of (name, parameter) of an optical stack
+
+    If names is None, all parameters of the model are returned.
+    """
+
+    named = dict(optics.named_parameters())
+
+    if names is None:
+        return list(named.items())
+
+    try:
+        return [(n, named[n]) for n in names]
+    except KeyError as err:
+        raise KeyError(f"Unknown parameter {err}, must be one of {list(named.keys())}")
+
+
+def parameters_to_vector(parameters):
+    "Concatenate (name, parameter) pairs into a flat detached vector"
+
+    return torch.cat([p.detach().reshape(-1) for _, p in parameters])
+
+
+def assign_vector(parameters, vector):
+    """
+    Write a flat vector into (name, parameter) pairs, in place
+
+    The update is done in place because shapes hold references to their
+    parameter tensors, so replacing the parameter object would not reach them.
+    """
+
+    offset = 0
+    with torch.no_grad():
+        for _, p in parameters:
+            n = p.numel()
+            p.copy_(vector[offset : offset + n].reshape(p.shape).to(dtype=p.dtype))
+            offset += n
+
+
+def evaluate_loss(optics, sampling, regularization=None):
+    "Evaluate the loss of an optical stack, with optional regularization"
+
+    output = optics(default_input, sampling)
+    loss = output.loss
+
+    if regularization is not None:
+        loss = loss + regularization(optics)
+
+    return loss
+
+
+def evaluate_population(optics, sampling, parameters, candidates, regularization=None):
+    """
+    Evaluate the loss of a population of candidate parameter vectors
+
+    Candidates are evaluated sequentially, one forward pass each: elements of
+    the optical stack filter rays with boolean masks, so the number of rays
+    is data dependent and candidates cannot be stacked along a vmap
+    dimension. Each candidate is evaluated without autograd bookkeeping and
+    the original parameter values are restored afterwards. To evaluate
+    candidates in parallel, see SystemPool.
+
+    Args:
+        parameters: list of (name, parameter) pairs
+        candidates: tensor of shape (P, D) where D is the total number of
+            scalar values in parameters
+
+    Returns:
+        Tensor of shape (P,) of losses, non finite losses are replaced by +inf
+    """
+
+    original = parameters_to_vector(parameters)
+    losses = torch.empty(candidates.shape[0], dtype=torch.float64)
+
+    try:
+        with torch.no_grad():
+            for i, candidate in enumerate(candidates):
+                assign_vector(parameters, candidate)
+                losses[i] = evaluate_loss(optics, sampling, regularization).item()
+    finally:
+        assign_vector(parameters, original)
+
+    return torch.where(torch.isfinite(losses), losses, math.inf)
+
+
+class CMAES:
+    """
+    Covariance Matrix Adaptation Evolution Strategy
+
+    Minimal ask / tell implementation of the (mu/mu_w, lambda)-CMA-ES with
+    default strategy parameters from Hansen's tutorial "The CMA Evolution
+    Strategy" (2016). All internal state is kept in float64.
+    """
+
+    def __init__(self, mean, sigma, popsize=None, generator=None):
+        self.mean = torch.as_tensor(mean, dtype=torch.float64).clone()
+        self.sigma = float(sigma)
+        self.generator = generator
+
+        n = self.mean.numel()
+        self.n = n
+        self.popsize = popsize if popsize is not None else 4 + int(3 * math.log(n))
+        self.mu = self.popsize // 2
+
+        # Recombination weights
+        weights = math.log(self.mu + 0.5) - torch.log(
+            torch.arange(1, self.mu + 1, dtype=torch.float64)
+        )
+        self.weights = weights / weights.sum()
+        self.mueff = (1.0 / torch.sum(self.weights**2)).item()
+
+        # Adaptation constants
+        mueff = self.mueff
+        self.cc = (4 + mueff / n) / (n + 4 + 2 * mueff / n)
+        self.cs = (mueff + 2) / (n + mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + mueff)
+        self.cmu = min(1 - self.c1, 2 * (mueff - 2 + 1 / mueff) / ((n + 2) ** 2 + mueff))
+        self.damps = 1 + 2 * max(0, math.sqrt((mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chiN = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n**2))
+
+        # Dynamic state
+        self.pc = torch.zeros(n, dtype=torch.float64)
+        self.ps = torch.zeros(n, dtype=torch.float64)
+        self.C = torch.eye(n, dtype=torch.float64)
+        self.generation = 0
+        self._eigen()
+
+    def _eigen(self):
+        # Symmetrize to avoid accumulating numerical asymmetry
+        self.C = (self.C + self.C.T) / 2
+        eigvals, self.B = torch.linalg.eigh(self.C)
+        self.D = torch.sqrt(torch.clamp(eigvals, min=1e-20))
+
+    def ask(self):
+        "Sample a new population, tensor of shape (popsize, n)"
+
+        z = torch.randn(
+            (self.popsize, self.n), dtype=torch.float64, generator=self.generator
+        )
+        y = (z * self.D) @ self.B.T
+        return self.mean + self.sigma * y
+
+    def tell(self, candidates, losses):
+        "Update the distribution given the losses of the sampled population"
+
+        n, mu = self.n, self.mu
+        order = torch.argsort(torch.as_tensor(losses))
+        selected = candidates[order[:mu]]
+
+        old_mean = self.mean
+        self.mean = self.weights @ selected
+        y_w = (self.mean - old_mean) / self.sigma
+
+        # Cumulation of the evolution paths
+        invsqrtC = self.B @ torch.diag(1 / self.D) @ self.B.T
+        self.ps = (1 - self.cs) * self.ps + math.sqrt(
+            self.cs * (2 - self.cs) * self.mueff
+        ) * (invsqrtC @ y_w)
+
+        ps_norm = torch.linalg.vector_norm(self.ps).item()
+        hsig = ps_norm / math.sqrt(
+            1 - (1 - self.cs) ** (2 * (self.generation + 1))
+        ) / self.chiN < 1.4 + 2 / (n + 1)
+
+        self.pc = (1 - self.cc) * self.pc + hsig * math.sqrt(
+            self.cc * (2 - self.cc) * self.mueff
+        ) * y_w
+
+        # Rank one and rank mu update of the covariance matrix
+        artmp = (selected - old_mean) / self.sigma
+        self.C = (
+            (1 - self.c1 - self.cmu) * self.C
+            + self.c1
+            * (
+                torch.outer(self.pc, self.pc)
+                + (1 - hsig) * self.cc * (2 - self.cc) * self.C
+            )
+            + self.cmu * artmp.T @ torch.diag(self.weights) @ artmp
+        )
+
+        # Step size adaptation
+        self.sigma *= math.exp((self.cs / self.damps) * (ps_norm / self.chiN - 1))
+
+        self.generation += 1
+        self._eigen()
+
+
+@dataclass
+class EvolutionRecord:
+    "Result of a gradient free optimization"
+
+    # Names of optimized parameters
+    names: list
+
+    # Best parameter vector found, shape (D,)
+    best: torch.Tensor
+
+    # Loss of the best parameter vector
+    best_loss: float
+
+    # Best and mean loss of each generation, shape (G,)
+    loss_best: torch.Tensor
+    loss_mean: torch.Tensor
+
+    # Number of loss evaluations, i.e. forward passes of the optical stack
+    num_evaluations: int
+
+
+def cmaes(
+    optics,
+    sampling,
+    num_generations,
+    sigma=0.1,
+    popsize=None,
+    parameters=None,
+    regularization=None,
+    seed=None,
+    nshow=20,
+    workers=1,
+):
+    """
+    Gradient free optimization of an optical stack with CMA-ES
+
+    Useful for losses that are discontinuous in the parameters, for example
+    when an aperture changes which rays survive.
+
+    Args:
+        sigma: initial standard deviation of the search distribution, either a
+            float used for all parameters or a dict of parameter name -> float.
+            The search runs in coordinates normalized by sigma so that
+            parameters of very different scales can be optimized jointly.
+        popsize: number of candidates per generation (default: 4 + 3 ln(D))
+        parameters: list of parameter names to optimize (default: all)
+        regularization: optional function optics -> loss term
+        seed: optional seed of the random number generator
+        workers: number of worker processes evaluating each generation, see
+            SystemPool
+
+    At the end, the best parameters found are written into the model.
+    """
+
+    params = select_parameters(optics, parameters)
+    if len(params) == 0:
+        raise ValueError("cmaes() needs at least one parameter to optimize")
+
+    x0 = parameters_to_vector(params).to(dtype=torch.float64)
+
+    # Per coordinate scale
+    if isinstance(sigma, dict):
+        scale = torch.cat(
+            [torch.full((p.numel(),), float(sigma[n]), dtype=torch.float64) for n, p in params]
+        )
+    else:
+        scale = torch.full_like(x0, float(sigma))
+
+    generator = torch.Generator()
+    if seed is not None:
+        generator.manual_seed(seed)
+    else:
+        generator.seed()
+
+    es = CMAES(torch.zeros_like(x0), 1.0, popsize=popsize, generator=generator)
+
+    pool = None
+    if workers > 1:
+        # Imported here because parallel depends on this module
+        from torchlensmaker.parallel import SystemPool
+        pool = SystemPool(optics, sampling, [n for n, _ in params], regularization, workers)
+
+    def evaluate(candidates):
+        if pool is not None:
+            return pool.evaluate(candidates)
+        return evaluate_population(optics, sampling, params, candidates, regularization)
+
+    loss_best = torch.zeros(num_generations, dtype=torch.float64)
+    loss_mean = torch.zeros(num_generations, dtype=torch.float64)
+
+    show_every = math.ceil(num_generations / nshow)
+
+    try:
+        best = x0.clone()
+        best_loss = evaluate(x0.unsqueeze(0))[0].item()
+        num_evaluations = 1
+
+        for i in range(num_generations):
+            z = es.ask()
+            candidates = x0 + z * scale
+            losses = evaluate(candidates)
+            num_evaluations += candidates.shape[0]
+            es.tell(z, losses)
+
+            imin = torch.argmin(losses)
+            if losses[imin] < best_loss:
+                best_loss = losses[imin].item()
+                best = candidates[imin].clone()
+
+            finite = losses[torch.isfinite(losses)]
+            loss_best[i] = losses[imin]
+            loss_mean[i] = finite.mean() if finite.numel() > 0 else math.inf
+
+            if i % show_every == 0:
+                iter_str = f"[{i:>3}/{num_generations}]"
+                L_str = f"L= {best_loss:>6.3f} | sigma= {es.sigma:.3e}"
+                print(f"{iter_str} {L_str}")
+    finally:
+        if pool is not None:
+            pool.close()
+
+    assign_vector(params, best)
+
+    return EvolutionRecord(
+        names=[n for n, _ in params],
+        best=best,
+        best_loss=best_loss,
+        loss_best=loss_best,
+        loss_mean=loss_mean,
+        num_evaluations=num_evaluations,
+    )
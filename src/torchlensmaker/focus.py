@@ -0,0 +1,103 @@
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.optics import ray_weights, mirror_pupil
+from torchlensmaker.spot import group_rays, segment_sum
+
+
+@dataclass
+class ThroughFocus:
+    """
+    RMS spot size as a function of the image plane position
+
+    All per group tensors are indexed like keys.
+    """
+
+    # Names of the columns used for grouping rays, and their unique values
+    columns: list
+    keys: torch.Tensor
+
+    # Position of the K planes, shape (K,)
+    positions: torch.Tensor
+
+    # RMS spot radius of each group at each plane, shape (G, K)
+    rms: torch.Tensor
+
+    # Plane position minimizing the sum of squared RMS radii over all groups
+    best_focus: torch.Tensor
+
+    # RMS radius of each group at best_focus, shape (G,)
+    best_rms: torch.Tensor
+
+    # Best focus position of each group on its own, shape (G,)
+    group_best_focus: torch.Tensor
+
+
+def through_focus(outputs, positions=None, num_planes=50, span=None, by=("object", "wavelength")):
+    """
+    Through focus RMS spot size and best focus of output rays, in closed form
+
+    For straight rays, the image plane coordinate of a ray at position x is
+    y = a + b*x, so the squared RMS spot size of a group of rays is the
+    quadratic var(a) + 2x cov(a, b) + x^2 var(b). Its minimum and its value on
+    any number of planes are computed directly from the per group moments,
+    without tracing rays to each plane or running an optimization loop.
+
+    The best focus is differentiable with respect to the parameters of the
+    optical stack.
+
+    Args:
+        outputs: OpticalData, typically the output of an optical stack
+        positions: tensor of shape (K,) of plane positions to evaluate.
+            Default: num_planes positions centered on the best focus
+        span: half width of the default positions range
+            (default: distance from the output target to the best focus)
+        by: columns identifying a field point
+
+    Returns:
+        ThroughFocus
+    """
+
+    rays = mirror_pupil(outputs.rays)
+    origins, vectors = rays.get(["RX", "RY"]), rays.get(["VX", "VY"])
+    weights = ray_weights(rays)
+
+    columns, keys, groups = group_rays(rays, by)
+    G = keys.shape[0]
+
+    # Line coefficients y = a + b*x of each ray
+    b = vectors[:, 1] / vectors[:, 0]
+    a = origins[:, 1] - origins[:, 0] * b
+
+    # Centered per group second order moments
+    total = segment_sum(weights, groups, G)
+    a_c = a - (segment_sum(weights * a, groups, G) / total)[groups]
+    b_c = b - (segment_sum(weights * b, groups, G) / total)[groups]
+
+    var_a = segment_sum(weights * a_c**2, groups, G) / total
+    cov_ab = segment_sum(weights * a_c * b_c, groups, G) / total
+    var_b = segment_sum(weights * b_c**2, groups, G) / total
+
+    def rms_at(x):
+        ms = var_a.unsqueeze(-1) + 2 * x * cov_ab.unsqueeze(-1) + x**2 * var_b.unsqueeze(-1)
+        return torch.sqrt(torch.clamp(ms, min=0.))
+
+    best_focus = -cov_ab.sum() / var_b.sum()
+    group_best_focus = -cov_ab / var_b
+
+    if positions is None:
+        if span is None:
+            span = torch.abs(best_focus - outputs.target[0]).item() or 1.0
+        center = best_focus.detach()
+        positions = torch.linspace(center - span, center + span, num_planes)
+
+    return ThroughFocus(
+        columns=columns,
+        keys=keys,
+        positions=positions,
+        rms=rms_at(positions.unsqueeze(0)),
+        best_focus=best_focus,
+        best_rms=rms_at(best_focus).squeeze(-1),
+        group_best_focus=group_best_focus,
+    )
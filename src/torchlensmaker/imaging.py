@@ -0,0 +1,109 @@
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.optics import default_input, ray_weights, mirror_pupil
+from torchlensmaker.raytracing import ray_plane_intersection
+from torchlensmaker.mtf import histogram
+from torchlensmaker.torch_extensions import flatten_sequence
+
+
+@dataclass
+class SimulatedImage:
+    "Intensity profile on a 1D pixel grid"
+
+    # Center of each pixel on the image plane, shape (P,)
+    positions: torch.Tensor
+
+    # Intensity received by each pixel, shape (P,)
+    intensity: torch.Tensor
+
+
+def trace_emitted(optics, sampling):
+    """
+    Evaluate an optical stack, and sum the weights of the rays emitted by its
+    light sources for each object coordinate, before any ray is blocked
+
+    Returns:
+        (outputs, objects, emitted): outputs of the stack, sorted distinct
+        object coordinates of the emitted rays, and total weight emitted for
+        each of them
+    """
+
+    emitted = []
+
+    def hook(module, args, outputs):
+        # Light sources append new rays to their inputs
+        num_in = args[0].rays.shape[0]
+        if outputs.rays.shape[0] > num_in and "object" in outputs.rays.columns:
+            emitted.append((outputs.rays.get("object")[num_in:], ray_weights(outputs.rays)[num_in:]))
+
+    handles = [element.register_forward_hook(hook) for element in dict.fromkeys(flatten_sequence(optics))]
+    try:
+        outputs = optics(default_input, sampling)
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    if not emitted:
+        raise ValueError("No light source of the optical stack emits rays with object coordinates")
+
+    objects, inverse = torch.unique(torch.cat([o for o, _ in emitted]), return_inverse=True)
+    weights = torch.cat([w for _, w in emitted]).detach()
+    totals = torch.zeros(objects.shape[0], dtype=weights.dtype).index_add_(0, inverse, weights)
+
+    return outputs, objects, totals
+
+
+def simulate_image(optics, sampling, profile, num_pixels, height, x=None, bandwidth=None, chunk_size=65536):
+    """
+    Simulate the image of an extended object formed by an optical stack
+
+    The object is sampled by the light source of the stack, which must
+    provide the 'object' column (for example ObjectAtInfinity, with
+    sampling["object"] object points). Each ray carries the intensity of its
+    object point, divided by the total weight of the rays emitted for that
+    point, and is splatted onto a pixel grid centered on the principal axis.
+
+    With a kernel bandwidth, splatting is differentiable with respect to the
+    ray positions and the simulated image can be used in a loss function.
+
+    Args:
+        profile: function mapping a tensor of object coordinates (the values
+            of the 'object' column, i.e. field angles in degrees for an
+            ObjectAtInfinity) to intensities of the same shape
+        num_pixels: number of pixels of the image
+        height: total height of the pixel grid
+        x: position of the image plane (default: the output target)
+        bandwidth: standard deviation of the Gaussian splatting kernel, or
+            None for hard binning
+        chunk_size: number of rays splatted at once with kernel splatting
+
+    Returns:
+        SimulatedImage
+    """
+
+    outputs, objects, emitted = trace_emitted(optics, sampling)
+
+    # Splat both halves of half pupil samples, so images are symmetric
+    rays = mirror_pupil(outputs.rays)
+
+    if x is None:
+        x = outputs.target[0]
+
+    positions = ray_plane_intersection(rays.get(["RX", "RY"]), rays.get(["VX", "VY"]), x)
+
+    # Energy carried by each ray. Rays blocked by the stack are lost, so
+    # normalize by the weights emitted for each object point.
+    object_coords = rays.get("object")
+    emitted = emitted[torch.searchsorted(objects, object_coords.detach().contiguous())]
+    weights = ray_weights(rays) * profile(object_coords) / emitted
+
+    pixel_size = height / num_pixels
+    start = torch.full((1,), -height / 2)
+    groups = torch.zeros(positions.shape[0], dtype=torch.long)
+
+    image = histogram(positions, weights, groups, 1, start, pixel_size, num_pixels, bandwidth, chunk_size)[0]
+    centers = -height / 2 + (torch.arange(num_pixels) + 0.5) * pixel_size
+
+    return SimulatedImage(centers, image)
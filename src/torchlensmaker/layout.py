@@ -0,0 +1,123 @@
+import torch
+import torch.nn as nn
+import weakref
+
+from dataclasses import dataclass
+from typing import Optional
+
+from torchlensmaker.optics import Gap, OpticalSurface
+from torchlensmaker.surface import Surface
+from torchlensmaker.torch_extensions import flatten_sequence, shape_tensors
+
+
+@dataclass
+class ElementLayout:
+    "Absolute placement of an optical element, computed without rays"
+
+    element: nn.Module
+
+    # Position of the element, i.e. the target of its input data, shape (2,)
+    target: torch.Tensor
+
+    # Surface of the element placed in absolute space, or None for elements
+    # without a surface
+    surface: Optional[Surface]
+
+    # Absolute position of each surface anchor, or empty for elements without
+    # a surface
+    anchors: dict
+
+
+# Layout of each module, with the state it was computed from
+_layout_cache = weakref.WeakKeyDictionary()
+
+
+def value_state(value):
+    "Hashable state of a tensor or python value, tensors are tracked by version"
+
+    if isinstance(value, torch.Tensor):
+        return (id(value), value._version)
+    return value
+
+
+def layout_state(optics, elements):
+    """
+    Everything the layout of an optical stack depends on: parameter versions,
+    the sequence of elements, their non parameter attributes and the versions
+    of shape tensors. Tensors are kept alive by the cache entry, so their ids
+    can't be reused by other tensors while the entry exists.
+    """
+
+    tensors = list(optics.parameters())
+    state = [value_state(p) for p in tensors]
+
+    for element in elements:
+        state.append(id(element))
+        if isinstance(element, Gap):
+            state.append(value_state(element.offset))
+            tensors.append(element.offset)
+        elif isinstance(element, OpticalSurface):
+            state.extend((id(element.shape), value_state(element.scale), element.anchors, value_state(element.decenter)))
+            tensors.extend((element.shape, element.scale, element.decenter))
+            for tensor in shape_tensors(element.shape):
+                state.append(value_state(tensor))
+                tensors.append(tensor)
+
+    return tuple(state), tensors
+
+
+def stack_layout(optics):
+    """
+    Absolute position and anchors of every element of an optical stack
+
+    This is a geometry only version of the forward pass: element positions
+    are computed like forward() does, starting at the origin, but without
+    tracing rays or registering hooks.
+
+    Layouts without autograd graph (when grad is disabled, or no tensor of
+    the stack requires grad) are cached per module, and recomputed only when
+    a tensor they depend on is modified in place (which increments its
+    version counter, as optimizers do) or replaced. Layouts that need a
+    graph are recomputed at every call, so that each call gets its own graph.
+
+    Returns:
+        list of ElementLayout, in execution order
+    """
+
+    elements = flatten_sequence(optics)
+    state, tensors = layout_state(optics, elements)
+
+    differentiable = torch.is_grad_enabled() and any(
+        isinstance(t, torch.Tensor) and t.requires_grad for t in tensors
+    )
+
+    cached = _layout_cache.get(optics)
+    if not differentiable and cached is not None and cached[0] == state:
+        return cached[2]
+
+    target = torch.zeros(2)
+    layout = []
+
+    for element in elements:
+        if isinstance(element, Gap):
+            layout.append(ElementLayout(element, target, None, {}))
+            target = target + torch.stack((torch.as_tensor(element.offset), torch.tensor(0.)))
+
+        elif isinstance(element, OpticalSurface):
+            surface = element.surface(target)
+            anchors = {anchor: surface.at(anchor) for anchor in Surface.valid_anchors}
+            layout.append(ElementLayout(element, target, surface, anchors))
+            target = anchors[element.anchors[1]] - element.decenter_offset()
+
+        else:
+            layout.append(ElementLayout(element, target, None, {}))
+
+    if not differentiable:
+        _layout_cache[optics] = (state, tensors, layout)
+    return layout
+
+
+def clear_layout_cache():
+    "Remove all cached layouts"
+
+    _layout_cache.clear()
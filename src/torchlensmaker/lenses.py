@@ -17,9 +17,6 @@ def lens_thickness_gap(inner_thickness, outer_thickness):
     return thickness, anchors
 
 
-sampling_none = {"rays": 0, "object": 0}
-
-
 class GenericLens(tlm.Module):
     "A generic lens class providing common lens functions"
 
@@ -29,27 +26,23 @@ class GenericLens(tlm.Module):
     def forward(self, inputs, sampling):
         return self.optics(inputs, sampling)
 
+    def surfaces_layout(self):
+        "Layout of the two surfaces of the lens, computed without rays"
+
+        layout = tlm.stack_layout(self)
+        return layout[0], layout[2]
+
     def inner_thickness(self):
         "Thickness at the center of the lens"
 
-        # Evaluate the lens stack with zero rays, just to forward compute positions
-        execute_list, _ = tlm.full_forward(self, tlm.default_input, sampling_none)
-        
-        # Get the surfaces to compute thickness
-        s1 = execute_list[0].module.surface(execute_list[0].inputs.target)
-        s2 = execute_list[2].module.surface(execute_list[2].inputs.target)
-        return torch.linalg.vector_norm(s1.at("origin") - s2.at("origin"))
+        s1, s2 = self.surfaces_layout()
+        return torch.linalg.vector_norm(s1.anchors["origin"] - s2.anchors["origin"])
     
     def outer_thickness(self):
         "Thickness at the outer radius of the lens"
 
-        # Evaluate the lens stack with zero rays, just to forward compute positions
-        execute_list, _ = tlm.full_forward(self, tlm.default_input, sampling_none)
-        
-        # Get the surfaces to compute thickness
-        s1 = execute_list[0].module.surface(execute_list[0].inputs.target)
-        s2 = execute_list[2].module.surface(execute_list[2].inputs.target)
-        return torch.linalg.vector_norm(s1.at("extent") - s2.at("extent"))
+        s1, s2 = self.surfaces_layout()
+        return torch.linalg.vector_norm(s1.anchors["extent"] - s2.anchors["extent"])
     
     def thickness_at(self, x):
         "Thickness at distance x from the center of the lens"
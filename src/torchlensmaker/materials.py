@@ -0,0 +1,114 @@
+import torch
+
+
+# Default wavelength in nanometers (helium d line), used when rays don't
+# carry a wavelength column
+default_wavelength = 587.6
+
+
+class Material:
+    """
+    Base class for optical materials
+
+    A material maps wavelengths in nanometers to refractive indices. All
+    materials evaluate tensors of wavelengths elementwise, so indices can be
+    computed for every ray at once.
+    """
+
+    def refractive_index(self, wavelength):
+        raise NotImplementedError
+
+
+class NonDispersiveMaterial(Material):
+    "A material with the same refractive index at all wavelengths"
+
+    def __init__(self, n):
+        self.n = torch.as_tensor(n, dtype=torch.float32)
+
+    def __repr__(self):
+        return f"NonDispersiveMaterial({self.n.item()})"
+
+    def refractive_index(self, wavelength):
+        return self.n.expand_as(torch.as_tensor(wavelength))
+
+
+class CauchyMaterial(Material):
+    """
+    Cauchy's equation: n = A + B / λ^2 + C / λ^4 + D / λ^6
+
+    with λ in micrometers
+    """
+
+    def __init__(self, A, B, C=0., D=0.):
+        self.A, self.B, self.C, self.D = A, B, C, D
+
+    def __repr__(self):
+        return f"CauchyMaterial(A={self.A}, B={self.B}, C={self.C}, D={self.D})"
+
+    def refractive_index(self, wavelength):
+        l2 = (torch.as_tensor(wavelength) / 1000) ** 2
+        return self.A + self.B / l2 + self.C / l2**2 + self.D / l2**3
+
+
+class SellmeierMaterial(Material):
+    """
+    Sellmeier equation: n^2 = 1 + sum_i B_i λ^2 / (λ^2 - C_i)
+
+    with λ in micrometers and C_i in square micrometers
+    """
+
+    def __init__(self, B, C):
+        assert len(B) == len(C)
+        self.B = torch.as_tensor(B, dtype=torch.float32)
+        self.C = torch.as_tensor(C, dtype=torch.float32)
+
+    def __repr__(self):
+        return f"SellmeierMaterial(B={self.B.tolist()}, C={self.C.tolist()})"
+
+    def refractive_index(self, wavelength):
+        l2 = (torch.as_tensor(wavelength) / 1000).unsqueeze(-1) ** 2
+        return torch.sqrt(1 + torch.sum(self.B * l2 / (l2 - self.C), dim=-1))
+
+
+# Built-in materials
+# Sellmeier coefficients from manufacturer data sheets (Schott) and Malitson (1965) for fused silica
+materials_table = {
+    "vacuum": NonDispersiveMaterial(1.0),
+    "air": NonDispersiveMaterial(1.000293),
+    "BK7": SellmeierMaterial(
+        [1.03961212, 0.231792344, 1.01046945],
+        [0.00600069867, 0.0200179144, 103.560653],
+    ),
+    "F2": SellmeierMaterial(
+        [1.34533359, 0.209073176, 0.937357162],
+        [0.00997743871, 0.0470450767, 111.886764],
+    ),
+    "SF11": SellmeierMaterial(
+        [1.73759695, 0.313747346, 1.89878101],
+        [0.013188707, 0.0623068142, 155.23629],
+    ),
+    "fused-silica": SellmeierMaterial(
+        [0.6961663, 0.4079426, 0.8974794],
+        [0.0684043**2, 0.1162414**2, 9.896161**2],
+    ),
+    "PMMA": SellmeierMaterial([1.1819], [0.011313]),
+}
+
+
+def get_material(material):
+    """
+    Get a Material object from either:
+        * a Material
+        * a name in the built-in materials table
+        * a number, for a non dispersive material
+    """
+
+    if isinstance(material, Material):
+        return material
+    elif isinstance(material, str):
+        try:
+            return materials_table[material]
+        except KeyError:
+            raise ValueError(f"Unknown material '{material}', must be one of {list(materials_table.keys())}")
+    else:
+        return NonDispersiveMaterial(material)
@@ -16,8 +16,10 @@ class Module(nn.Module):
         super().__setattr__("_shapes", {})
 
     def __getattr__(self, name: str):
-        if name in self.__dict__["_shapes"]:
-            return self.__dict__["_shapes"][name]
+        # _shapes may not exist yet while unpickling or copying, before __dict__ is restored
+        shapes = self.__dict__.get("_shapes", {})
+        if name in shapes:
+            return shapes[name]
         else:
             return super().__getattr__(name)
     
@@ -0,0 +1,169 @@
+import math
+import torch
+
+from dataclasses import dataclass
+from typing import Optional
+
+from torchlensmaker.raytracing import ray_plane_intersection
+from torchlensmaker.optics import ray_weights, mirror_pupil
+from torchlensmaker.spot import group_rays, segment_sum
+
+
+def histogram(values, weights, groups, num_groups, start, bin_width, num_bins, bandwidth=None, chunk_size=65536):
+    """
+    Weighted histogram of values, for each group
+
+    Args:
+        values: tensor of shape (N,)
+        weights: tensor of shape (N,)
+        groups: tensor of shape (N,), group index of each value
+        start: tensor of shape (G,), position of the first bin edge of each group
+        bin_width: width of the bins, same for all groups
+        bandwidth: if None, values are counted in the bin they fall into with
+            a scatter add, which is not differentiable with respect to values.
+            Otherwise, values are splatted into all bins with a Gaussian kernel
+            of this standard deviation (kernel density estimation), which is
+            differentiable with respect to values and weights.
+        chunk_size: with a bandwidth, values are processed by chunks of this
+            size so that memory is bounded by chunk_size * num_bins
+
+    Returns:
+        tensor of shape (G, num_bins)
+    """
+
+    G, B = num_groups, num_bins
+
+    if bandwidth is None:
+        bins = torch.floor((values.detach() - start[groups]) / bin_width).to(dtype=torch.long)
+        inside = (bins >= 0) & (bins < B)
+        flat = torch.zeros(G * B, dtype=weights.dtype).index_add(
+            0, (groups * B + bins)[inside], weights[inside]
+        )
+        return flat.view(G, B)
+
+    # Normalize the kernel so that each value sums to its weight over the bins
+    norm = bin_width / (math.sqrt(2 * math.pi) * bandwidth)
+    offsets = (torch.arange(B, dtype=values.dtype) + 0.5) * bin_width
+
+    hist = torch.zeros((G, B), dtype=weights.dtype)
+    for v, w, g in zip(
+        torch.split(values, chunk_size),
+        torch.split(weights, chunk_size),
+        torch.split(groups, chunk_size),
+    ):
+        # Distance of each value to each bin center, shape (C, B)
+        d = (v - start[g]).unsqueeze(1) - offsets
+        kernel = norm * torch.exp(-0.5 * (d / bandwidth) ** 2)
+        hist = hist.index_add(0, g, w.unsqueeze(1) * kernel)
+
+    return hist
+
+
+@dataclass
+class MTFData:
+    """
+    Geometric line spread function and modulation transfer function
+
+    All per group tensors are indexed like keys.
+    """
+
+    # Names of the columns used for grouping rays, and their unique values
+    columns: list
+    keys: torch.Tensor
+
+    # Bin centers of the line spread function of each group, shape (G, B)
+    # Bins are centered on the centroid of each group
+    positions: torch.Tensor
+
+    # Line spread function, shape (G, B), normalized to sum to one
+    lsf: torch.Tensor
+
+    # Spatial frequencies in cycles per unit length, shape (F,)
+    frequencies: torch.Tensor
+
+    # Modulation transfer function, shape (G, F)
+    mtf: torch.Tensor
+
+    # Kernel bandwidth used for the line spread function, if any
+    bandwidth: Optional[float]
+
+    def at(self, frequencies):
+        """
+        MTF at arbitrary frequencies, shape (G, F)
+
+        Evaluated with a direct Fourier transform of the line spread
+        function, which is differentiable.
+        """
+
+        f = torch.as_tensor(frequencies, dtype=self.lsf.dtype)
+        phase = -2 * math.pi * f.view(1, -1, 1) * self.positions.unsqueeze(1)
+        real = torch.sum(self.lsf.unsqueeze(1) * torch.cos(phase), dim=-1)
+        imag = torch.sum(self.lsf.unsqueeze(1) * torch.sin(phase), dim=-1)
+        return torch.sqrt(real**2 + imag**2)
+
+
+def geometric_mtf(outputs, x=None, num_bins=256, half_width=None, bandwidth=None, by=("object", "wavelength"), chunk_size=65536):
+    """
+    Geometric MTF of output rays, for all field points at once
+
+    Rays are intersected with the image plane X = x and grouped by the
+    unique values of the 'by' columns. For each group, a line spread function
+    is histogrammed around the group's centroid and its Fourier transform
+    modulus is the MTF.
+
+    With a kernel bandwidth, the histogram is a differentiable kernel density
+    estimate and the MTF can be optimized directly. Note that the kernel
+    attenuates the MTF by a factor exp(-2 pi^2 bandwidth^2 f^2).
+
+    Args:
+        outputs: OpticalData, typically the output of an optical stack
+        x: position of the image plane (default: the output target)
+        num_bins: number of bins of the line spread function
+        half_width: half width of the line spread function window, same for
+            all groups so that they share frequencies
+            (default: 1.5 times the largest distance of a ray to its centroid)
+        bandwidth: standard deviation of the Gaussian binning kernel, or None
+            for hard binning
+        by: columns identifying a field point
+        chunk_size: number of rays processed at once with kernel binning
+
+    Returns:
+        MTFData
+    """
+
+    rays = mirror_pupil(outputs.rays)
+    if x is None:
+        x = outputs.target[0]
+
+    positions = ray_plane_intersection(rays.get(["RX", "RY"]), rays.get(["VX", "VY"]), x)
+    weights = ray_weights(rays)
+
+    columns, keys, groups = group_rays(rays, by)
+    G = keys.shape[0]
+
+    total = segment_sum(weights, groups, G)
+    centroid = segment_sum(weights * positions, groups, G) / total
+
+    if half_width is None:
+        half_width = 1.5 * torch.abs(positions - centroid[groups]).detach().max().item() or 1.0
+    bin_width = 2 * half_width / num_bins
+    start = centroid - half_width
+
+    lsf = histogram(positions, weights, groups, G, start, bin_width, num_bins, bandwidth, chunk_size)
+    lsf = lsf / lsf.sum(dim=1, keepdim=True)
+
+    bin_centers = start.unsqueeze(1) + (torch.arange(num_bins) + 0.5) * bin_width
+
+    spectrum = torch.abs(torch.fft.rfft(lsf, dim=1))
+    mtf = spectrum / spectrum[:, :1]
+    frequencies = torch.fft.rfftfreq(num_bins, d=bin_width)
+
+    return MTFData(
+        columns=columns,
+        keys=keys,
+        positions=bin_centers,
+        lsf=lsf,
+        frequencies=frequencies,
+        mtf=mtf,
+        bandwidth=bandwidth,
+    )
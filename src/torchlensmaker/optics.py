@@ -9,6 +9,8 @@ from dataclasses import dataclass, replace
 from torchlensmaker.raytracing import (
     refraction,
     reflection,
+    fused_refraction,
+    fused_reflection,
     ray_point_squared_distance,
     position_on_ray,
     rays_to_coefficients,
@@ -22,21 +24,33 @@ from torchlensmaker.shapes import Line
 
 from torchlensmaker.tensorframe import TensorFrame
 
+from torchlensmaker.materials import get_material, default_wavelength
+
 
 def loss_nonpositive(parameters, scale=1):
     return torch.where(parameters > 0, torch.pow(scale*parameters, 2), torch.zeros_like(parameters))
 
 
-def linear_magnification(object_coordinates, image_coordinates):
+def linear_magnification(object_coordinates, image_coordinates, weights=None):
     T, V = object_coordinates, image_coordinates
+    W = torch.ones_like(T) if weights is None else weights
 
-    # Fit linear magnification with least square and compute residuals
-    mag = torch.sum(T * V) / torch.sum(T**2)
+    # Fit linear magnification with weighted least square and compute residuals
+    mag = torch.sum(W * T * V) / torch.sum(W * T**2)
     residuals = V - mag * T
 
     return mag, residuals
 
 
+def ray_weights(rays):
+    "Weight of each ray, from the 'weight' column if present, else ones"
+
+    if "weight" in rays.columns:
+        return rays.get("weight")
+    else:
+        return torch.ones(rays.shape[0], dtype=rays.data.dtype)
+
+
 @dataclass
 class OpticalData:
     """
@@ -61,6 +75,116 @@ class OpticalData:
     loss: torch.Tensor
 
 
+def sample_wavelengths(wavelength, sampling):
+    """
+    Sample the wavelength dimension of a light source
+
+    wavelength: either a single wavelength, or a (min, max) range sampled
+    with sampling["wavelength"] values (default 1: the center of the range)
+    """
+
+    wavelength = torch.as_tensor(wavelength, dtype=torch.float32)
+
+    if wavelength.dim() == 0:
+        return wavelength.unsqueeze(0)
+
+    num_wavelengths = sampling.get("wavelength", 1)
+    if num_wavelengths == 1:
+        return wavelength.mean().unsqueeze(0)
+    else:
+        return torch.linspace(wavelength[0], wavelength[1], num_wavelengths)
+
+
+def half_pupil(num_rays):
+    """
+    Sampling of the upper half of a symmetric beam
+
+    Light sources sample their beam symmetrically around the principal axis
+    with linspace(), so for on-axis sources in an axisymmetric system, the
+    lower half of the rays mirror the upper half exactly. Tracing only the
+    upper half and doubling its weight gives the same weighted statistics,
+    as long as they are measured relative to the principal axis (like the
+    FocalPoint and Image losses). Metrics relative to the rays centroid,
+    like spot_diagram(), restore the full pupil with mirror_pupil().
+
+    Half pupil sampling is enabled with sampling["symmetry"], and ignored by
+    OpticalSequence if the system is not axisymmetric.
+
+    Returns: (indices, weights)
+        indices: indices of the upper half samples, including the center sample
+        weights: 2 for each sample, except 1 for the center sample if num_rays is odd
+    """
+
+    indices = torch.arange(num_rays // 2, num_rays)
+    weights = torch.full((indices.shape[0],), 2.)
+    if num_rays % 2 == 1:
+        weights[0] = 1.
+    return indices, weights
+
+
+def mirror_pupil(rays):
+    """
+    Full pupil rays from half pupil rays
+
+    Each ray of weight 2, sampled by half_pupil(), is replaced by itself and
+    its mirror image across the principal axis, both with weight 1. Output
+    rays of an axisymmetric system can be mirrored at any stage, so
+    statistics relative to the rays centroid match full pupil sampling.
+    """
+
+    if "weight" not in rays.columns:
+        return rays
+
+    weights = rays.get("weight")
+    halved = weights == 2
+    if not bool(halved.any()):
+        return rays
+
+    mirrored = rays.masked(halved)
+    columns = {"RY": -mirrored.get("RY"), "VY": -mirrored.get("VY"), "weight": torch.ones_like(weights[halved])}
+    if "rays" in rays.columns:
+        columns["rays"] = 1 - mirrored.get("rays")
+
+    return rays.update(weight=torch.where(halved, 1., weights)).stack(mirrored.update(**columns))
+
+
+def sample_symmetric(data, on_axis, sampling):
+    """
+    Add a weight column to rays data of shape (num_rays, D), sampled along
+    the base dimension. If sampling["symmetry"] is true and the source is on
+    the principal axis, keep only the upper half of the samples.
+    """
+
+    num_rays = data.shape[0]
+    if sampling.get("symmetry", False) and on_axis:
+        indices, weights = half_pupil(num_rays)
+        data = data[indices]
+    else:
+        weights = torch.ones(num_rays)
+
+    return torch.cat((data, weights.unsqueeze(1).to(dtype=data.dtype)), dim=1)
+
+
+def aimed_samples(aim, num_rays):
+    "Check that aimed samples of a light source match the sampling"
+
+    if aim.shape[-1] != num_rays:
+        raise ValueError(
+            f"Light source was aimed with {aim.shape[-1]} rays but sampling has {num_rays}, call aim_rays() again"
+        )
+    return aim
+
+
+def broadcast_wavelengths(data, wavelengths):
+    """
+    Repeat rays data of shape (N, C) for each of the W wavelengths,
+    and add the wavelength as the last column. Returns shape (N*W, C+1)
+    """
+
+    N, W = data.shape[0], wavelengths.shape[0]
+    return torch.cat((data.repeat(W, 1), wavelengths.repeat_interleave(N).unsqueeze(1)), dim=1)
+
+
 default_input = OpticalData(
     rays = TensorFrame(torch.empty((0, 4)), columns = ["RX", "RY", "VX", "VY"]),
     target = torch.zeros(2),
@@ -74,13 +198,13 @@ class FocalPoint(nn.Module):
         super().__init__()
 
     def forward(self, inputs: OpticalData, sampling: dict):
-        num_rays = inputs.rays.shape[0]
+        weights = ray_weights(inputs.rays)
         rays_origins, rays_vectors = (
             inputs.rays.get(["RX", "RY"]),
             inputs.rays.get(["VX", "VY"]),
         )
-        sum_squared = ray_point_squared_distance(rays_origins, rays_vectors, inputs.target).sum()
-        loss = sum_squared / num_rays
+        sum_squared = (weights * ray_point_squared_distance(rays_origins, rays_vectors, inputs.target)).sum()
+        loss = sum_squared / weights.sum()
 
         return replace(inputs, loss=inputs.loss + loss)
 
@@ -106,9 +230,9 @@ class Image(nn.Module):
 
         points = torch.stack((points_x, points_y), dim=-1)
 
-        num_rays = rays_origins.shape[0]
-        sum_squared = ray_point_squared_distance(rays_origins, rays_vectors, points).sum()
-        loss = sum_squared / num_rays
+        weights = ray_weights(inputs.rays)
+        sum_squared = (weights * ray_point_squared_distance(rays_origins, rays_vectors, points)).sum()
+        loss = sum_squared / weights.sum()
 
         return replace(inputs, loss=inputs.loss + loss)
 
@@ -129,13 +253,16 @@ class ImagePlane(nn.Module):
             inputs.rays.get(["VX", "VY"]),
         )
         a, b, c = -V[:, 1], V[:, 0], V[:, 1] * orig[:, 0] - V[:, 0] * orig[:, 1]
-        X = torch.full_like(a, inputs.target[0].item())
+        X = inputs.target[0].expand_as(a)
         Y = (- c - a*X ) / b
 
         # Compute loss
         # TODO this could be outside this class
-        mag, residuals = linear_magnification(object_coordinates=inputs.rays.get("object"), image_coordinates=Y)
-        loss = inputs.loss + torch.sum(torch.pow(residuals, 2))
+        weights = ray_weights(inputs.rays)
+        mag, residuals = linear_magnification(
+            object_coordinates=inputs.rays.get("object"), image_coordinates=Y, weights=weights
+        )
+        loss = inputs.loss + torch.sum(weights * torch.pow(residuals, 2))
 
         # Add the image coordinate column to the rays TensorFrame
         return replace(
@@ -146,10 +273,11 @@ class ImagePlane(nn.Module):
 
 
 class PointSource(nn.Module):
-    def __init__(self, beam_angle, height=0, object_coord=0.):
+    def __init__(self, beam_angle, height=0, object_coord=0., wavelength=default_wavelength):
         """
         height: height of the point source above the principal axis
         beam_angle: total angle of the emitted beam of rays (in degrees)
+        wavelength: wavelength in nm, or (min, max) range sampled along the wavelength dimension
         """
 
         super().__init__()
@@ -160,6 +288,14 @@ class PointSource(nn.Module):
 
         # TODO remove this and do sampling directly in object?
         self.object_coord = torch.as_tensor(object_coord, dtype=torch.float32)
+        self.wavelength = wavelength
+
+        # Ray angles set by ray aiming, see tlm.aim_rays()
+        self.aim = None
+
+    def samples(self, sampling):
+        "Default ray angles, sampled uniformly over the beam angle"
+        return torch.linspace(-self.beam_angle / 2, self.beam_angle / 2, sampling["rays"])
 
     def forward(self, inputs: OpticalData, sampling: dict):
 
@@ -170,18 +306,25 @@ class PointSource(nn.Module):
             inputs.target + torch.tensor([0.0, self.height]), (num_rays, 1)
         )
 
-        angles = torch.linspace(
-            -self.beam_angle / 2, self.beam_angle / 2, num_rays
-        )
+        if self.aim is None:
+            angles = self.samples(sampling)
+            coord_base = (angles + self.beam_angle / 2) / self.beam_angle
+        else:
+            angles = aimed_samples(self.aim, num_rays)
+            coord_base = (torch.arange(num_rays) + 0.5) / num_rays
+
         rays_vectors = rot2d(torch.tensor([1.0, 0.0]), angles)
 
         # normalized coordinate along the base dimension
-        coord_base = (angles + self.beam_angle / 2) / self.beam_angle
         coord_object = self.object_coord.expand_as(coord_base)
 
+        data = torch.cat((rays_origins, rays_vectors, coord_base.unsqueeze(1), coord_object.unsqueeze(1)), dim=1)
+        on_axis = bool(inputs.target[1] == 0 and self.height == 0)
+        data = sample_symmetric(data, on_axis, sampling)
+
         new_rays = TensorFrame(
-            torch.cat((rays_origins, rays_vectors, coord_base.unsqueeze(1), coord_object.unsqueeze(1)), dim=1),
-            columns=["RX", "RY", "VX", "VY", "rays", "object"],
+            broadcast_wavelengths(data, sample_wavelengths(self.wavelength, sampling)),
+            columns=["RX", "RY", "VX", "VY", "rays", "object", "weight", "wavelength"],
         )
 
         # Add new rays to the input rays
@@ -194,10 +337,11 @@ class PointSource(nn.Module):
 
 
 class PointSourceAtInfinity(nn.Module):
-    def __init__(self, beam_diameter, angle=0.):
+    def __init__(self, beam_diameter, angle=0., wavelength=default_wavelength):
         """
         beam_diameter: diameter of the beam of parallel light rays
         angle: angle of indidence with respect to the principal axis, in degrees
+        wavelength: wavelength in nm, or (min, max) range sampled along the wavelength dimension
 
         samples along the base sampling dimension
         """
@@ -205,28 +349,45 @@ class PointSourceAtInfinity(nn.Module):
         super().__init__()
         self.beam_diameter = torch.as_tensor(beam_diameter, dtype=torch.float32)
         self.angle = torch.deg2rad(torch.as_tensor(angle, dtype=torch.float32))
+        self.wavelength = wavelength
 
-    def forward(self, inputs: OpticalData, sampling: dict):
-        # Create new rays by sampling the beam diameter
-        num_rays = sampling["rays"]
+        # Ray heights set by ray aiming, see tlm.aim_rays()
+        self.aim = None
+
+    def samples(self, sampling):
+        "Default ray heights, sampled uniformly over the beam diameter"
         margin = 0.1  # TODO
-        RX = torch.zeros(num_rays)
-        RY = torch.linspace(
+        return torch.linspace(
             -self.beam_diameter / 2 + margin,
             self.beam_diameter / 2 - margin,
-            num_rays,
+            sampling["rays"],
         )
 
+    def forward(self, inputs: OpticalData, sampling: dict):
+        # Create new rays by sampling the beam diameter
+        num_rays = sampling["rays"]
+        RX = torch.zeros(num_rays)
+
+        if self.aim is None:
+            RY = self.samples(sampling)
+            coord_base = (RY + self.beam_diameter / 2) / self.beam_diameter
+        else:
+            RY = aimed_samples(self.aim, num_rays)
+            coord_base = (torch.arange(num_rays) + 0.5) / num_rays
+
         rays_origins = inputs.target + torch.column_stack((RX, RY))
         vect = rot2d(torch.tensor([1.0, 0.0]), self.angle)
         rays_vectors = torch.tile(vect, (num_rays, 1))
 
         # normalized coordinate along the base dimension
-        coord_base = (RY + self.beam_diameter / 2) / self.beam_diameter
+
+        data = torch.cat((rays_origins, rays_vectors, coord_base.unsqueeze(1)), dim=1)
+        on_axis = bool(inputs.target[1] == 0 and self.angle == 0)
+        data = sample_symmetric(data, on_axis, sampling)
 
         new_rays = TensorFrame(
-            torch.cat((rays_origins, rays_vectors, coord_base.unsqueeze(1)), dim=1),
-            columns=["RX", "RY", "VX", "VY", "rays"],
+            broadcast_wavelengths(data, sample_wavelengths(self.wavelength, sampling)),
+            columns=["RX", "RY", "VX", "VY", "rays", "weight", "wavelength"],
         )
 
         return OpticalData(
@@ -238,16 +399,27 @@ class PointSourceAtInfinity(nn.Module):
 
 
 class ObjectAtInfinity(nn.Module):
-    def __init__(self, beam_diameter, angular_size, angle=0):
+    def __init__(self, beam_diameter, angular_size, angle=0, wavelength=default_wavelength):
         """
         angular_size: apparent angular size of the object, in degrees
         angle: angle of incidence of the object's center with the principal axis, in degrees
+        wavelength: wavelength in nm, or (min, max) range sampled along the wavelength dimension
         """
 
         super().__init__()
         self.beam_diameter = torch.as_tensor(beam_diameter, dtype=torch.float32)
         self.angular_size = torch.as_tensor(angular_size, dtype=torch.float32)
         self.angle = torch.deg2rad(torch.as_tensor(angle, dtype=torch.float32))
+        self.wavelength = wavelength
+
+        # Ray heights of each object point set by ray aiming, shape (object, rays),
+        # see tlm.aim_rays()
+        self.aim = None
+
+    def samples(self, sampling):
+        "Default ray heights of each object point, shape (object, rays)"
+        points = PointSourceAtInfinity(self.beam_diameter).samples(sampling)
+        return points.expand(sampling["object"], -1)
 
     def forward(self, inputs: OpticalData, sampling: dict):
         # An object at infinity is a collection of points at infinity,
@@ -255,13 +427,21 @@ class ObjectAtInfinity(nn.Module):
 
         num_samples = sampling["object"]
 
+        if self.aim is not None and tuple(self.aim.shape) != (num_samples, sampling["rays"]):
+            raise ValueError(
+                f"Light source was aimed with {tuple(self.aim.shape)} (object, rays) samples "
+                f"but sampling has {(num_samples, sampling['rays'])}, call aim_rays() again"
+            )
+
         angles = torch.linspace(-self.angular_size/2., self.angular_size/2, num_samples)
 
         rays = inputs.rays
 
-        for angle in angles:
+        for i, angle in enumerate(angles):
             # add a PointSourceAtInfinity to represent the point source at that angle
-            mod = PointSourceAtInfinity(self.beam_diameter, angle=angle + self.angle)
+            mod = PointSourceAtInfinity(self.beam_diameter, angle=angle + self.angle, wavelength=self.wavelength)
+            if self.aim is not None:
+                mod.aim = self.aim[i]
             outputs = mod(inputs, sampling)
 
             # Add object coordinates to the point source rays
@@ -327,15 +507,24 @@ class OpticalSurface(Module):
     Common base class for ReflectiveSurface and RefractiveSurface
     """
 
-    def __init__(self, shape, scale=1., anchors=("origin", "origin")):
+    def __init__(self, shape, scale=1., anchors=("origin", "origin"), decenter=0.):
+        """
+        decenter: offset of the surface along the Y axis, perpendicular to the
+        principal axis. Elements after a decentered surface are not offset.
+        """
+
         super().__init__()
 
         self.shape = shape
         self.scale = scale
         self.anchors = anchors
+        self.decenter = decenter
+
+    def decenter_offset(self):
+        return torch.stack((torch.tensor(0.), torch.as_tensor(self.decenter, dtype=torch.float32)))
 
     def surface(self, pos):
-        return Surface(self.shape, pos=pos, scale=self.scale, anchor=self.anchors[0])
+        return Surface(self.shape, pos=pos + self.decenter_offset(), scale=self.scale, anchor=self.anchors[0])
 
     def forward(self, inputs: OpticalData, sampling: dict):
         surface = self.surface(inputs.target)
@@ -390,10 +579,16 @@ class OpticalSurface(Module):
             # Verify no weirdness again
             assert torch.all(torch.isfinite(collision_normals))
 
+            # Wavelength of each colliding ray, for dispersive materials
+            if "wavelength" in inputs.rays.columns:
+                wavelength = inputs.rays.get("wavelength")[valid]
+            else:
+                wavelength = None
+
             # Refract or reflect rays based on the derived class implementation
-            output_rays = self.optical_function(rays_vectors, collision_normals)
+            output_rays = self.optical_function(rays_vectors, collision_normals, wavelength, sampling.get("fused", False))
 
-        new_target = surface.at(self.anchors[1])
+        new_target = surface.at(self.anchors[1]) - self.decenter_offset()
 
         # TODO
         if valid is not None:
@@ -416,18 +611,40 @@ class OpticalSurface(Module):
 
 
 class ReflectiveSurface(OpticalSurface):
-    def __init__(self, shape, scale=1., anchors=("origin", "origin")):
-        super().__init__(shape, scale, anchors)
+    def __init__(self, shape, scale=1., anchors=("origin", "origin"), decenter=0.):
+        super().__init__(shape, scale, anchors, decenter)
         
 
-    def optical_function(self, rays, normals):
+    def optical_function(self, rays, normals, wavelength, fused=False):
+        if fused:
+            return fused_reflection(rays, normals)
         return reflection(rays, normals)
 
 
 class RefractiveSurface(OpticalSurface):
-    def __init__(self, shape, n, scale=1., anchors=("origin", "origin")):
-        super().__init__(shape, scale, anchors)
-        self.n1, self.n2 = n
-        
-    def optical_function(self, rays, normals):
-        return refraction(rays, normals, self.n1, self.n2, critical_angle='clamp')
+    def __init__(self, shape, n, scale=1., anchors=("origin", "origin"), decenter=0.):
+        """
+        n: tuple (n1, n2) of the materials before and after the surface. Each
+        can be a number, a name of the built-in materials table (see
+        tlm.materials_table) or a tlm.Material
+        """
+
+        super().__init__(shape, scale, anchors, decenter)
+        self.n1, self.n2 = map(get_material, n)
+
+    def refractive_indices(self, wavelength=None):
+        """
+        Refractive indices (n1, n2) at the given wavelengths in nm
+        (default: the default wavelength)
+        """
+
+        if wavelength is None:
+            wavelength = torch.tensor(default_wavelength)
+
+        return self.n1.refractive_index(wavelength), self.n2.refractive_index(wavelength)
+
+    def optical_function(self, rays, normals, wavelength, fused=False):
+        n1, n2 = self.refractive_indices(wavelength)
+        if fused:
+            return fused_refraction(rays, normals, n1, n2)
+        return refraction(rays, normals, n1, n2, critical_angle='clamp')
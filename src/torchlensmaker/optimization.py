@@ -0,0 +1,137 @@
+import math
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.optics import default_input
+from torchlensmaker.checkpoint import CheckpointWriter, load_checkpoint, rng_state, set_rng_state
+
+
+def get_all_gradients(model):
+    grads = []
+    for param in model.parameters():
+        if param.grad is not None:
+            grads.append(param.grad.view(-1))
+    return torch.cat(grads)
+
+
+@dataclass
+class OptimizationRecord:
+    "History of a gradient descent optimization"
+
+    # Loss at each iteration, shape (num_iter,)
+    loss: torch.Tensor
+
+    # Value of each named parameter at each iteration, before the optimizer step
+    parameters: dict
+
+
+def stack_record(parameters_record):
+    return {n: torch.stack(values) if values else torch.empty(0) for n, values in parameters_record.items()}
+
+
+def run_optimization(
+    optics,
+    optimizer,
+    sampling,
+    num_iter,
+    nshow=20,
+    regularization=None,
+    checkpoint=None,
+    checkpoint_every=100,
+    resume=None,
+):
+    """
+    Optimize an optical stack with a torch optimizer, without plotting
+
+    Args:
+        nshow: number of progress lines printed, or 0 for none
+        regularization: optional function optics -> loss term
+        checkpoint: optional path of a checkpoint file, written every
+            checkpoint_every iterations and at the end, on a background thread.
+            It holds the parameters, optimizer state, random number generator
+            state and the recorded history.
+        resume: optional path of a checkpoint to resume from. The optics and
+            optimizer must be built the same way as for the interrupted run,
+            which then continues bit-exactly from the checkpointed iteration.
+
+    Returns:
+        OptimizationRecord
+    """
+
+    # torch.autograd.detect_anomaly(True)
+
+    parameters_record = {
+        n: []
+        for n, _ in optics.named_parameters()
+    }
+
+    loss_record = torch.zeros(num_iter)
+
+    start = 0
+    if resume is not None:
+        state = load_checkpoint(resume)
+        optics.load_state_dict(state["optics"])
+        optimizer.load_state_dict(state["optimizer"])
+        set_rng_state(state["rng"])
+        start = state["iteration"]
+        loss_record[:start] = state["loss"]
+        for n, values in state["parameters"].items():
+            parameters_record[n] = list(values)
+
+    show_every = math.ceil(num_iter / nshow) if nshow else None
+
+    writer = CheckpointWriter(checkpoint) if checkpoint is not None else None
+
+    def save_checkpoint(iteration):
+        writer.save({
+            "iteration": iteration,
+            "optics": optics.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "rng": rng_state(),
+            "loss": loss_record[:iteration],
+            "parameters": stack_record(parameters_record),
+        })
+
+    try:
+        for i in range(start, num_iter):
+
+            optimizer.zero_grad()
+
+            output = optics(default_input, sampling)
+
+            # Get loss from the accumulator in the output
+            loss = output.loss
+
+            if regularization is not None:
+                loss = loss + regularization(optics)
+
+            loss_record[i] = loss.detach()
+            loss.backward()
+
+            # Record parameter values
+            for n, param in optics.named_parameters():
+                parameters_record[n].append(param.detach().clone())
+
+            grad = get_all_gradients(optics)
+            if torch.isnan(grad).any():
+                print("ERROR: nan in grad", grad)
+                raise RuntimeError("nan in gradient, check your torch.where() =)")
+
+            optimizer.step()
+
+            if writer is not None and ((i + 1) % checkpoint_every == 0 or i + 1 == num_iter):
+                save_checkpoint(i + 1)
+
+            if show_every is not None and i % show_every == 0:
+                iter_str = f"[{i:>3}/{num_iter}]"
+                L_str = f"L= {loss.item():>6.3f} | grad norm= {torch.linalg.norm(grad)}"
+                print(f"{iter_str} {L_str}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return OptimizationRecord(
+        loss=loss_record,
+        parameters=stack_record(parameters_record),
+    )
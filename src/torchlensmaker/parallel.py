@@ -0,0 +1,76 @@
+import copy
+import os
+import torch
+
+from concurrent.futures import ProcessPoolExecutor
+
+from torchlensmaker.evolution import select_parameters, evaluate_population
+
+
+# State of a SystemPool worker process, set by init_worker()
+_worker = {}
+
+
+def init_worker(optics, sampling, names, regularization):
+    # Candidates are evaluated on a private copy, so that workers never write to the shared parameters
+    local = copy.deepcopy(optics)
+    _worker.update(
+        shared=optics,
+        local=local,
+        sampling=sampling,
+        parameters=select_parameters(local, names),
+        regularization=regularization,
+    )
+
+
+def evaluate_chunk(candidates):
+    shared, local = _worker["shared"], _worker["local"]
+
+    # Pick up in place updates of the shared parameters made by the parent process
+    local.load_state_dict(shared.state_dict())
+
+    return evaluate_population(local, _worker["sampling"], _worker["parameters"], candidates, _worker["regularization"])
+
+
+class SystemPool:
+    """
+    Pool of worker processes evaluating candidate parameters of an optical system
+
+    The parameters of the system are moved to shared memory, and the system is
+    sent to each worker once, when it starts. After that, only candidate
+    parameter vectors and losses go through the pool, and in place updates of
+    the system parameters in the parent process (for example by
+    assign_vector() or an optimizer step) are seen by workers without copying.
+
+    With a 'spawn' or 'forkserver' start method, the system, sampling and
+    regularization function must be picklable.
+
+    Usage:
+        with tlm.SystemPool(optics, sampling, workers=8) as pool:
+            losses = pool.evaluate(candidates)
+    """
+
+    def __init__(self, optics, sampling, parameters=None, regularization=None, workers=None):
+        optics.share_memory()
+        self.parameters = select_parameters(optics, parameters)
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(optics, sampling, [n for n, _ in self.parameters], regularization),
+        )
+
+    def evaluate(self, candidates):
+        "Same as evaluate_population(), with candidates split over the workers"
+
+        chunks = [c for c in torch.tensor_split(candidates, self.workers) if c.shape[0] > 0]
+        return torch.cat(list(self.executor.map(evaluate_chunk, chunks)))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,273 @@
+import torch
+import torch.nn as nn
+
+from dataclasses import dataclass
+from typing import Optional
+
+from torchlensmaker.optics import (
+    Gap,
+    Aperture,
+    OpticalSurface,
+    RefractiveSurface,
+    ReflectiveSurface,
+)
+from torchlensmaker.torch_extensions import flatten_sequence
+
+
+# Paraxial optics with ray transfer (ABCD) matrices
+#
+# Rays are represented by their height y and reduced angle n*u, so that
+# transfer matrices have unit determinant. Reflection is handled by the
+# unfolding convention: the refractive index changes sign at each mirror, and
+# distances keep the sign of the absolute X axis (which is also how Gap
+# offsets are given after a mirror). With this convention a mirror is a
+# refraction from n to -n.
+
+
+@dataclass
+class ParaxialSurface:
+    "A refracting or reflecting surface, for paraxial optics"
+
+    # Absolute position of the vertex on the principal axis
+    x: torch.Tensor
+
+    # Signed curvature at the vertex, in absolute space
+    curvature: torch.Tensor
+
+    # Fourth order sag coefficient at the vertex, in absolute space
+    quartic: torch.Tensor
+
+    # Signed refractive indices before and after the surface
+    n1: torch.Tensor
+    n2: torch.Tensor
+
+    element: nn.Module
+
+    def matrix(self):
+        power = (self.n2 - self.n1) * self.curvature
+        return torch.stack((
+            torch.stack((torch.ones_like(power), torch.zeros_like(power))),
+            torch.stack((-power, torch.ones_like(power))),
+        ))
+
+
+@dataclass
+class ParaxialStop:
+    "An aperture stop, for paraxial optics"
+
+    x: torch.Tensor
+    diameter: torch.Tensor
+    element: nn.Module
+
+
+def transfer_matrix(distance, n):
+    "Transfer matrix of a propagation by a signed distance in a medium of signed index n"
+
+    d = torch.as_tensor(distance) / n
+    return torch.stack((
+        torch.stack((torch.ones_like(d), d)),
+        torch.stack((torch.zeros_like(d), torch.ones_like(d))),
+    ))
+
+
+def paraxial_layout(optics, n0=1.0, wavelength=None):
+    """
+    Paraxial representation of an optical stack
+
+    Positions are computed like the forward pass does, but without rays.
+
+    Args:
+        n0: refractive index of the medium before the first element, used
+            when the stack starts with a reflective surface
+        wavelength: wavelength in nm used to evaluate refractive indices
+            (default: the default wavelength)
+
+    Returns:
+        list of ParaxialSurface and ParaxialStop, in execution order
+    """
+
+    target = torch.zeros(2)
+    direction = 1.0
+    n = torch.as_tensor(n0, dtype=torch.float32)
+    layout = []
+
+    for element in flatten_sequence(optics):
+        if isinstance(element, Gap):
+            target = target + torch.stack((torch.as_tensor(element.offset), torch.tensor(0.)))
+
+        elif isinstance(element, Aperture):
+            layout.append(ParaxialStop(target[0], torch.as_tensor(element.diameter), element))
+
+        elif isinstance(element, OpticalSurface):
+            surface = element.surface(target)
+
+            if isinstance(element, RefractiveSurface):
+                n1, n2 = element.refractive_indices(wavelength)
+                n1, n2 = direction * n1, direction * n2
+            elif isinstance(element, ReflectiveSurface):
+                n1, n2 = n, -n
+                direction = -direction
+            else:
+                raise ValueError(f"Unsupported surface type {type(element)}")
+
+            layout.append(ParaxialSurface(
+                surface.to_abs()[0],
+                surface.vertex_curvature(),
+                surface.quartic_coefficient(),
+                n1,
+                n2,
+                element,
+            ))
+            n = n2
+            target = surface.at(element.anchors[1]) - element.decenter_offset()
+
+    return layout
+
+
+@dataclass
+class ParaxialSystem:
+    """
+    First order properties of an optical stack
+
+    All positions are absolute positions on the principal axis.
+    """
+
+    # System matrix from the first vertex to the last vertex, shape (2, 2)
+    matrix: torch.Tensor
+
+    # Signed refractive indices of the object and image spaces
+    n_in: torch.Tensor
+    n_out: torch.Tensor
+
+    # Positions of the first and last vertex
+    x_first: torch.Tensor
+    x_last: torch.Tensor
+
+    # Entrance pupil diameter, or None if the stack has no aperture
+    entrance_pupil: Optional[torch.Tensor]
+
+    @property
+    def power(self):
+        return -self.matrix[1, 0]
+
+    @property
+    def efl(self):
+        "Effective focal length"
+        return 1.0 / self.power
+
+    @property
+    def rear_focal_point(self):
+        A, C = self.matrix[0, 0], self.matrix[1, 0]
+        return self.x_last - A * self.n_out / C
+
+    @property
+    def front_focal_point(self):
+        C, D = self.matrix[1, 0], self.matrix[1, 1]
+        return self.x_first + self.n_in * D / C
+
+    @property
+    def bfl(self):
+        "Back focal length: signed distance from the last vertex to the rear focal point"
+        return self.rear_focal_point - self.x_last
+
+    @property
+    def ffl(self):
+        "Front focal length: signed distance from the front focal point to the first vertex"
+        return self.x_first - self.front_focal_point
+
+    @property
+    def rear_principal_plane(self):
+        A, C = self.matrix[0, 0], self.matrix[1, 0]
+        return self.x_last + self.n_out * (1 - A) / C
+
+    @property
+    def front_principal_plane(self):
+        C, D = self.matrix[1, 0], self.matrix[1, 1]
+        return self.x_first + self.n_in * (D - 1) / C
+
+    @property
+    def f_number(self):
+        "Working f-number for an object at infinity, None if the stack has no aperture"
+        if self.entrance_pupil is None:
+            return None
+        return torch.abs(self.efl) / self.entrance_pupil
+
+
+def layout_surfaces(layout):
+    "Surfaces of a paraxial layout, raises if there are none"
+
+    surfaces = [e for e in layout if isinstance(e, ParaxialSurface)]
+
+    if len(surfaces) == 0:
+        raise ValueError("Paraxial optics needs at least one optical surface")
+
+    return surfaces
+
+
+def system_matrices(layout):
+    """
+    Transfer matrices of a paraxial layout
+
+    Returns: (matrix, stop, stop_matrix)
+        matrix: system matrix from the first vertex to the last vertex
+        stop: the first ParaxialStop of the layout, or None
+        stop_matrix: matrix from the first vertex to the stop, or None
+    """
+
+    surfaces = layout_surfaces(layout)
+    x_first = surfaces[0].x
+    x, n = x_first, surfaces[0].n1
+    matrix = torch.eye(2)
+    stop_matrix, stop = None, None
+
+    for element in layout:
+        # Propagate up to the element
+        matrix = transfer_matrix(element.x - x, n) @ matrix
+        x = element.x
+
+        if isinstance(element, ParaxialSurface):
+            matrix = element.matrix() @ matrix
+            n = element.n2
+        elif stop is None:
+            stop, stop_matrix = element, matrix
+
+    # Remove the propagation after the last surface
+    matrix = transfer_matrix(surfaces[-1].x - x, n) @ matrix
+
+    return matrix, stop, stop_matrix
+
+
+def paraxial(optics, n0=1.0, wavelength=None):
+    """
+    Compute first order properties of an optical stack with paraxial optics
+
+    This is much cheaper than tracing rays and differentiable with respect to
+    the shape parameters and gaps, so it can also be used as a loss term or to
+    initialize a design.
+
+    Chromatic properties can be obtained by calling this with different
+    wavelengths.
+
+    Returns:
+        ParaxialSystem
+    """
+
+    layout = paraxial_layout(optics, n0, wavelength)
+    surfaces = layout_surfaces(layout)
+    matrix, stop, stop_matrix = system_matrices(layout)
+
+    # Entrance pupil diameter for an object at infinity: parallel rays of
+    # height y at the first vertex have height A*y at the stop
+    if stop is not None:
+        entrance_pupil = stop.diameter / torch.abs(stop_matrix[0, 0])
+    else:
+        entrance_pupil = None
+
+    return ParaxialSystem(
+        matrix=matrix,
+        n_in=surfaces[0].n1,
+        n_out=surfaces[-1].n2,
+        x_first=surfaces[0].x,
+        x_last=surfaces[-1].x,
+        entrance_pupil=entrance_pupil,
+    )
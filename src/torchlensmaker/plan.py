@@ -0,0 +1,91 @@
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.optics import OpticalData, Gap
+from torchlensmaker.torch_extensions import flatten_sequence, is_axisymmetric, is_frozen
+
+
+def gap_kernel(element):
+    """
+    Forward function of a Gap, with the offset vector precomputed while the
+    offset is constant
+
+    The vector is computed again when the offset is replaced or modified in
+    place (tracked by its version counter), and offsets that require grad
+    use the forward of the Gap.
+    """
+
+    cache = {}
+
+    def forward(inputs, sampling):
+        offset = element.offset
+        if isinstance(offset, torch.Tensor) and offset.requires_grad:
+            return element.forward(inputs, sampling)
+
+        # The offset is kept in the key, so that its id can't be reused
+        key = (offset, offset._version) if isinstance(offset, torch.Tensor) else (offset, None)
+        if cache.get("key") is None or cache["key"][0] is not key[0] or cache["key"][1] != key[1]:
+            cache["key"] = key
+            cache["vector"] = torch.stack((torch.as_tensor(offset), torch.tensor(0.)))
+
+        return OpticalData(inputs.rays, inputs.target + cache["vector"], None, inputs.loss)
+
+    return forward
+
+
+@dataclass
+class ExecutionPlan:
+    """
+    Linear execution plan of an optical stack, see compile_plan()
+    """
+
+    # Leaf elements of the stack, in execution order
+    elements: list
+
+    # Forward function of each element
+    kernels: list
+
+    def __call__(self, inputs, sampling):
+        # Same as OpticalSequence: half pupil sampling is only exact for axisymmetric systems
+        if sampling.get("symmetry", False) and not all(is_axisymmetric(element) for element in self.elements):
+            sampling = dict(sampling, symmetry=False)
+
+        for element, kernel in zip(self.elements, self.kernels):
+            if is_frozen(element) and not any(t.requires_grad for t in (inputs.rays.data, inputs.target, inputs.loss)):
+                with torch.no_grad():
+                    inputs = kernel(inputs, sampling)
+            else:
+                inputs = kernel(inputs, sampling)
+        return inputs
+
+
+def compile_plan(optics):
+    """
+    Compile an optical stack into a linear execution plan
+
+    Nested sequences and lenses are flattened into a list of their leaf
+    elements, and the plan calls their forward functions directly in a
+    single loop. This skips the nested nn.Module calls and their hooks
+    machinery, which dominates the cost of a forward pass at small ray
+    counts. Constant gap vectors are precomputed, and updated when their
+    offset changes.
+
+    The plan computes the same outputs as optics(inputs, sampling) and is
+    differentiable in the same way. Parameter updates (in place or not),
+    decentering and freezing or unfreezing elements are taken into account at
+    each call, but:
+        * forward hooks are not called, so use the stack itself with
+          full_forward() and for rendering
+        * the prefix cache of OpticalSequence is not used
+        * the plan must be compiled again after changing the structure of
+          the stack (adding, removing or replacing elements)
+
+    Returns:
+        ExecutionPlan, callable like the stack
+    """
+
+    elements = flatten_sequence(optics)
+    kernels = [gap_kernel(element) if isinstance(element, Gap) else element.forward for element in elements]
+
+    return ExecutionPlan(elements, kernels)
@@ -0,0 +1,38 @@
+import matplotlib.pyplot as plt
+import torch
+
+import torchlensmaker as tlm
+
+from torchlensmaker.spot import spot_diagram
+
+
+def plot_spot_diagram(optics, sampling, x=None, by=("object", "wavelength")):
+    """
+    Compute and plot spot diagrams of the given optical system
+
+    Left: image plane coordinate of each ray relative to the centroid of its
+    field point. Right: encircled energy of each field point.
+    """
+
+    # Evaluate the optical stack
+    output = optics(tlm.default_input, sampling)
+    spots = spot_diagram(output, x=x, by=by)
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
+
+    offsets = (spots.positions - spots.centroid[spots.groups]).detach().numpy()
+    ax1.plot(spots.groups.numpy(), offsets, linestyle="none", marker="+")
+    ax1.set_xticks(range(spots.keys.shape[0]))
+    ax1.set_xticklabels([", ".join(f"{v:.3g}" for v in key.tolist()) for key in spots.keys], rotation=45)
+    ax1.set_xlabel(", ".join(spots.columns) if spots.columns else "field")
+    ax1.set_ylabel("Distance to centroid")
+
+    radii = spots.ee_radii.numpy()
+    for g in range(spots.keys.shape[0]):
+        rms = spots.rms[g].item()
+        ax2.plot(radii, spots.encircled_energy[g].numpy(), label=f"[{g}] rms = {rms:.3g}")
+    ax2.set_xlabel("Radius")
+    ax2.set_ylabel("Encircled energy")
+    ax2.legend()
+
+    plt.show()
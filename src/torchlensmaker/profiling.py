@@ -0,0 +1,158 @@
+import time
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.torch_extensions import flatten_sequence
+
+
+@dataclass
+class ElementProfile:
+    "Accumulated profiling data of an optical element"
+
+    # Path of the element in the stack, with its type
+    path: str
+
+    # Number of forward calls
+    calls: int = 0
+
+    # Total wall time of forward and backward, in seconds
+    forward_time: float = 0.
+    backward_time: float = 0.
+
+    # Total number of input, output and blocked rays
+    rays_in: int = 0
+    rays_out: int = 0
+    blocked: int = 0
+
+    # Total size of the output rays data, in bytes
+    bytes: int = 0
+
+
+class Profiler:
+    """
+    Per element profiling and ray accounting of an optical stack
+
+    Used as a context manager, the profiler registers hooks on the leaf
+    elements of the stack, and removes them on exit, so it costs nothing
+    when not in use. Within the context, each element forward is wrapped in
+    a torch.profiler.record_function() range named after its path in the
+    stack, and the profiler accumulates:
+
+        * forward wall time
+        * backward wall time, measured with tensor hooks between the
+          gradient of the element's output rays and the gradient of its
+          input rays (gradients flowing only through targets or the loss
+          accumulator are not timed)
+        * number of rays in, out and blocked
+        * size of the output rays data
+
+    Hooks disable the prefix cache of OpticalSequence, and compiled
+    execution plans don't call them.
+
+    Args:
+        optics: optical stack to profile
+        chrome_trace: if not None, also run the torch profiler within the
+            context and export a Chrome trace to this path on exit
+        enabled: if False, the context does nothing
+
+    Example:
+        with tlm.Profiler(optics) as profiler:
+            loss = optics(tlm.default_input, sampling).loss
+            loss.backward()
+        print(profiler.table())
+    """
+
+    def __init__(self, optics, chrome_trace=None, enabled=True):
+        self.optics = optics
+        self.chrome_trace = chrome_trace
+        self.enabled = enabled
+
+        leaves = flatten_sequence(optics)
+        names = {module: name for name, module in optics.named_modules()}
+        self.profiles = {
+            element: ElementProfile(f"{names.get(element, '?')} ({type(element).__name__})")
+            for element in leaves
+        }
+
+        self._handles = []
+        self._ranges = {}
+        self._starts = {}
+        self._torch_profiler = None
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+
+        for element in self.profiles:
+            self._handles.append(element.register_forward_pre_hook(self.pre_hook))
+            self._handles.append(element.register_forward_hook(self.hook))
+
+        if self.chrome_trace is not None:
+            self._torch_profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self._torch_profiler.__enter__()
+
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+        if self._torch_profiler is not None:
+            self._torch_profiler.__exit__(*exc)
+            self._torch_profiler.export_chrome_trace(self.chrome_trace)
+            self._torch_profiler = None
+
+        return False
+
+    def pre_hook(self, module, args):
+        record = torch.profiler.record_function(self.profiles[module].path)
+        record.__enter__()
+        self._ranges[module] = record
+        self._starts[module] = time.perf_counter()
+
+    def hook(self, module, args, outputs):
+        elapsed = time.perf_counter() - self._starts.pop(module)
+        self._ranges.pop(module).__exit__(None, None, None)
+
+        inputs = args[0]
+        profile = self.profiles[module]
+        profile.calls += 1
+        profile.forward_time += elapsed
+        profile.rays_in += inputs.rays.shape[0]
+        profile.rays_out += outputs.rays.shape[0]
+        profile.bytes += outputs.rays.data.numel() * outputs.rays.data.element_size()
+        if outputs.blocked is not None:
+            profile.blocked += int(outputs.blocked.sum())
+
+        # Time backward between the gradient of the output and input rays
+        if outputs.rays.data.requires_grad and inputs.rays.data.requires_grad:
+            start = []
+
+            def output_grad_hook(grad):
+                start.append(time.perf_counter())
+
+            def input_grad_hook(grad):
+                if start:
+                    profile.backward_time += time.perf_counter() - start.pop()
+
+            outputs.rays.data.register_hook(output_grad_hook)
+            inputs.rays.data.register_hook(input_grad_hook)
+
+    def summary(self):
+        "List of ElementProfile, in execution order"
+
+        return list(self.profiles.values())
+
+    def table(self):
+        "Per element profiling table, as a string"
+
+        header = f"{'element':<40} {'calls':>6} {'forward ms':>11} {'backward ms':>12} {'rays in':>9} {'rays out':>9} {'blocked':>8} {'MB':>8}"
+        lines = [header, "-" * len(header)]
+        for p in self.summary():
+            lines.append(
+                f"{p.path:<40} {p.calls:>6} {1000*p.forward_time:>11.3f} {1000*p.backward_time:>12.3f} "
+                f"{p.rays_in:>9} {p.rays_out:>9} {p.blocked:>8} {p.bytes / 1e6:>8.3f}"
+            )
+        return "\n".join(lines)
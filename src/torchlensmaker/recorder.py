@@ -0,0 +1,142 @@
+import math
+import torch
+
+from contextlib import contextmanager
+
+from torchlensmaker.optics import OpticalData
+from torchlensmaker.tensorframe import TensorFrame
+from torchlensmaker.torch_extensions import ForwardContext, flatten_sequence
+
+
+class StageBuffer:
+    "Storage for the recorded rays of one stage, reused across traces"
+
+    def __init__(self):
+        self.data = None
+
+    def store(self, rays, selected, columns):
+        columns = [c for c in columns if c in rays.columns]
+        rows = torch.nonzero(selected).squeeze(1)
+        cols = torch.tensor([rays.columns.index(c) for c in columns], dtype=torch.long)
+        n, c = rows.shape[0], len(columns)
+
+        # Grow the buffer only when needed
+        if self.data is None or self.data.shape[0] < n or self.data.shape[1] != c or self.data.dtype != rays.data.dtype:
+            self.data = torch.empty((n, c), dtype=rays.data.dtype)
+
+        view = self.data[:n]
+        view.copy_(rays.data.index_select(0, rows).index_select(1, cols))
+        return TensorFrame(view, columns)
+
+
+class TraceRecorder:
+    """
+    Records a compact trace of the rays at each stage of an optical stack
+
+    This is a lightweight alternative to full_forward(). Forward hooks are
+    registered once on the leaf elements of the stack, and only do work
+    while recording. For each stage, only the given columns of a decimated
+    subset of rays are copied into buffers that are reused across traces,
+    detached from the autograd graph. Rays are tracked through blocking
+    elements, so the same rays are recorded at every stage.
+
+    Recorded stages are ForwardContext(module, inputs, outputs) of
+    OpticalData, like the entries of full_forward(), with a blocked mask
+    restricted to the recorded rays. Their ray data is overwritten by the
+    next trace.
+
+    Note that while attached, the recorder hooks disable the prefix cache
+    of OpticalSequence, and that compiled execution plans don't call hooks.
+
+    Args:
+        optics: optical stack to record
+        columns: columns of the rays to record (missing columns are skipped)
+        max_rays: maximum number of rays recorded for each batch of rays
+            emitted by a light source, or None to record all rays
+    """
+
+    def __init__(self, optics, columns=("RX", "RY", "VX", "VY"), max_rays=None):
+        self.optics = optics
+        self.columns = list(columns)
+        self.max_rays = max_rays
+        self.stages = []
+        self.buffers = []
+        self._recording = False
+        self._selected = None
+        # Elements used more than once in the stack are hooked once, their hook runs at each use
+        self._handles = [element.register_forward_hook(self.hook) for element in dict.fromkeys(flatten_sequence(optics))]
+
+    def remove(self):
+        "Remove the hooks of the recorder"
+
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def select(self, num_rays):
+        "Decimated selection of num_rays new rays"
+
+        stride = 1 if self.max_rays is None else max(1, math.ceil(num_rays / self.max_rays))
+        return torch.arange(num_rays) % stride == 0
+
+    @contextmanager
+    def recording(self):
+        "Record forward evaluations of the stack within this context"
+
+        self.stages = []
+        self._selected = None
+        self._recording = True
+        try:
+            yield self
+        finally:
+            self._recording = False
+
+    def trace(self, inputs, sampling):
+        "Evaluate the stack while recording, and return its outputs"
+
+        with self.recording():
+            return self.optics(inputs, sampling)
+
+    def hook(self, module, args, outputs):
+        if not self._recording:
+            return
+
+        inputs = args[0]
+        num_in, num_out = inputs.rays.shape[0], outputs.rays.shape[0]
+
+        with torch.no_grad():
+            selected_in = self._selected
+            if selected_in is None or selected_in.shape[0] != num_in:
+                selected_in = self.select(num_in)
+
+            # Track the recorded rays through the element
+            blocked = None
+            if outputs.blocked is not None and outputs.blocked.shape[0] == num_in:
+                selected_out = selected_in[~outputs.blocked]
+                blocked = outputs.blocked[selected_in]
+            elif num_out >= num_in:
+                # Light sources append new rays
+                selected_out = torch.cat((selected_in, self.select(num_out - num_in)))
+            else:
+                selected_out = self.select(num_out)
+
+            index = len(self.stages)
+            if index == len(self.buffers):
+                self.buffers.append((StageBuffer(), StageBuffer()))
+            buffer_in, buffer_out = self.buffers[index]
+
+            recorded_inputs = OpticalData(
+                buffer_in.store(inputs.rays, selected_in, self.columns),
+                inputs.target.detach().clone(),
+                None,
+                inputs.loss.detach(),
+            )
+            recorded_outputs = OpticalData(
+                buffer_out.store(outputs.rays, selected_out, self.columns),
+                outputs.target.detach().clone(),
+                blocked,
+                outputs.loss.detach(),
+            )
+
+        self.stages.append(ForwardContext(module, recorded_inputs, recorded_outputs))
+        self._selected = selected_out
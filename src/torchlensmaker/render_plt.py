@@ -39,10 +39,8 @@ def draw_rays(ax, rays_origins, rays_ends, color):
 
 
 def get_color_data(rays, color_dim: str):
-        if color_dim == "rays":
-            return rays.get("rays")
-        elif color_dim == "object":
-            return rays.get("object")
+        if color_dim in ("rays", "object", "wavelength"):
+            return rays.get(color_dim)
         else:
             return "orange"
 
@@ -223,10 +221,17 @@ def render_all(ax, optics, sampling, **rendering):
 
     color_dim = rendering.get("color_dim", None)
     end = rendering.get("end", None)
+    max_rays = rendering.get("max_rays", None)
 
-    execute_list, outputs = tlm.full_forward(optics, tlm.default_input, sampling)
+    # Record only the columns and rays needed for rendering
+    columns = ["RX", "RY", "VX", "VY"] + ([color_dim] if color_dim is not None else [])
+    recorder = tlm.TraceRecorder(optics, columns=columns, max_rays=max_rays)
+    try:
+        recorder.trace(tlm.default_input, sampling)
+    finally:
+        recorder.remove()
 
-    for module, inputs, outputs in execute_list:
+    for module, inputs, outputs in recorder.stages:
         # Find matching artist and use it to render
         for typ, artist in artists_dict.items():
             if isinstance(module, typ):
@@ -236,8 +241,8 @@ def render_all(ax, optics, sampling, **rendering):
                 break
 
     # Draw output rays
-    if end is not None:
-        draw_output_rays(ax, outputs.rays, color_dim, end)
+    if end is not None and len(recorder.stages) > 0:
+        draw_output_rays(ax, recorder.stages[-1].outputs.rays, color_dim, end)
 
 
 
@@ -262,6 +267,10 @@ def render_plt(optics, sampling=default_sampling, **rendering):
 
         color_dim (None):
             Coordinate dimension to use for coloring rays
+
+        max_rays (None):
+            Maximum number of rays drawn for each light source.
+            If None, all rays are drawn.
     """
 
     fig, ax = plt.subplots(figsize=(12, 8))
@@ -0,0 +1,132 @@
+import math
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.paraxial import (
+    ParaxialSurface,
+    paraxial_layout,
+    layout_surfaces,
+    system_matrices,
+    transfer_matrix,
+)
+
+
+seidel_names = ["spherical", "coma", "astigmatism", "petzval", "distortion"]
+
+
+@dataclass
+class SeidelSums:
+    """
+    Third order (Seidel) aberration coefficients S_I to S_V
+
+    Columns are, in order: spherical aberration, coma, astigmatism, Petzval
+    field curvature and distortion.
+    """
+
+    # Contribution of each surface, shape (S, 5)
+    surfaces: torch.Tensor
+
+    # Lagrange invariant of the marginal and chief rays
+    lagrange: torch.Tensor
+
+    @property
+    def total(self):
+        "Seidel sums of the whole system, shape (5,)"
+        return self.surfaces.sum(dim=0)
+
+    def __getattr__(self, name):
+        if name in seidel_names:
+            return self.total[seidel_names.index(name)]
+        raise AttributeError(name)
+
+    def as_dict(self):
+        return dict(zip(seidel_names, self.total))
+
+
+def seidel(optics, field_angle, pupil_radius=None, n0=1.0, wavelength=None):
+    """
+    Seidel aberration coefficients of an optical stack, for an object at infinity
+
+    A paraxial marginal ray and chief ray are traced through the sequence,
+    and the classical surface contributions are summed (Welford, "Aberrations
+    of Optical Systems", chapter 7). Aspheric shapes contribute through the
+    fourth order term of their sag at the vertex.
+
+    The result is differentiable with respect to the shape parameters and
+    gaps, so it can be used as a loss term.
+
+    Args:
+        field_angle: angle of the chief ray with the principal axis, in degrees
+        pupil_radius: height of the marginal ray at the first surface. If
+            None, the stack must contain an Aperture and the marginal ray goes
+            through the edge of it.
+        n0: refractive index of the medium before the first element
+        wavelength: wavelength in nm (default: the default wavelength)
+
+    Returns:
+        SeidelSums
+    """
+
+    layout = paraxial_layout(optics, n0, wavelength)
+    surfaces = layout_surfaces(layout)
+    _, stop, stop_matrix = system_matrices(layout)
+
+    n = surfaces[0].n1
+    ubar = math.tan(math.radians(field_angle))
+
+    # Marginal ray: parallel to the axis, through the edge of the stop.
+    # Chief ray: at the field angle, through the center of the stop.
+    if stop is not None:
+        A, B = stop_matrix[0, 0], stop_matrix[0, 1]
+        y = stop.diameter / 2 / A if pupil_radius is None else torch.as_tensor(pupil_radius)
+        ybar = -B * n * ubar / A
+    elif pupil_radius is not None:
+        y = torch.as_tensor(pupil_radius)
+        ybar = torch.tensor(0.)
+    else:
+        raise ValueError("seidel() needs either a pupil_radius or an Aperture in the stack")
+
+    # Rays as columns of (height, reduced angle)
+    rays = torch.stack((
+        torch.stack((torch.as_tensor(y, dtype=torch.float32), torch.zeros(()))),
+        torch.stack((torch.as_tensor(ybar, dtype=torch.float32), n * ubar)),
+    ), dim=1)
+
+    lagrange = rays[1, 1] * rays[0, 0] - rays[1, 0] * rays[0, 1]
+
+    contributions = []
+    x = surfaces[0].x
+    for surface in surfaces:
+        rays = transfer_matrix(surface.x - x, n) @ rays
+        x = surface.x
+
+        c, n1, n2 = surface.curvature, surface.n1, surface.n2
+        y, ybar = rays[0, 0], rays[0, 1]
+        u, ubar = rays[1, 0] / n1, rays[1, 1] / n1
+
+        # Refraction invariants of the marginal and chief rays
+        A = n1 * (u + y * c)
+        Abar = n1 * (ubar + ybar * c)
+
+        rays = surface.matrix() @ rays
+        delta_u = rays[1, 0] / n2**2 - u / n1
+        delta_inv_n = 1 / n2 - 1 / n1
+
+        S1 = -A**2 * y * delta_u
+        S2 = -A * Abar * y * delta_u
+        S3 = -Abar**2 * y * delta_u
+        S4 = -lagrange**2 * c * delta_inv_n
+        S5 = Abar / A * (S3 + S4)
+
+        # Deviation of the shape from a sphere of the same vertex curvature
+        aspheric = 8 * (surface.quartic - c**3 / 8) * (n2 - n1)
+        S1 = S1 + aspheric * y**4
+        S2 = S2 + aspheric * y**3 * ybar
+        S3 = S3 + aspheric * y**2 * ybar**2
+        S5 = S5 + aspheric * y * ybar**3
+
+        contributions.append(torch.stack((S1, S2, S3, S4, S5)))
+        n = n2
+
+    return SeidelSums(torch.stack(contributions), lagrange)
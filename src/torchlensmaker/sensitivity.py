@@ -0,0 +1,154 @@
+import torch
+import torch.autograd.forward_ad as fwAD
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from torchlensmaker.module import Module
+from torchlensmaker.optics import default_input
+from torchlensmaker.evolution import select_parameters
+
+
+@contextmanager
+def substitute_parameters(optics, replacements):
+    """
+    Temporarily replace parameters of an optical stack by other tensors
+
+    Parameters are referenced both by modules and by the shapes registered on
+    tlm.Module (shapes store their parameter 'name' as attribute '_name'), so
+    both references are swapped and restored on exit.
+
+    Args:
+        replacements: dict of parameter -> replacement tensor
+    """
+
+    by_id = {id(p): t for p, t in replacements.items()}
+    restore = []
+
+    try:
+        for module in optics.modules():
+            for name, p in module._parameters.items():
+                if p is not None and id(p) in by_id:
+                    restore.append((module._parameters, name, p))
+                    module._parameters[name] = by_id[id(p)]
+
+            if isinstance(module, Module):
+                for shape in module._shapes.values():
+                    for name, p in shape.parameters().items():
+                        if id(p) in by_id:
+                            restore.append((shape.__dict__, "_" + name, p))
+                            setattr(shape, "_" + name, by_id[id(p)])
+        yield
+    finally:
+        for container, name, p in reversed(restore):
+            container[name] = p
+
+
+def output_function(output):
+    "Normalize the output argument of jacobian() to a function OpticalData -> Tensor"
+
+    if callable(output):
+        return output
+    elif output == "loss":
+        return lambda data: data.loss
+    elif isinstance(output, str):
+        return lambda data: data.rays.get(output)
+    else:
+        raise ValueError(f"output must be 'loss', a rays column name or a callable. Got {repr(output)}.")
+
+
+@dataclass
+class Sensitivity:
+    "Jacobian of an output of an optical stack with respect to its parameters"
+
+    # Value of the output, shape (*O)
+    output: torch.Tensor
+
+    # Dict of parameter name -> tensor of shape (*O, *P) where P is the shape of the parameter
+    jacobian: dict
+
+    def norms(self):
+        "Dict of parameter name -> Frobenius norm of its jacobian block"
+        return {n: torch.linalg.vector_norm(j).item() for n, j in self.jacobian.items()}
+
+    def ranking(self):
+        "Parameter names sorted by decreasing influence on the output"
+        norms = self.norms()
+        return sorted(norms, key=norms.get, reverse=True)
+
+
+def jacobian(optics, sampling, output="loss", parameters=None, vectorize=None):
+    """
+    Jacobian of an output of an optical stack with respect to its parameters,
+    computed with forward mode automatic differentiation
+
+    Forward mode is cheaper than reverse mode when outputs outnumber
+    parameters, for example for per ray image coordinates.
+
+    Args:
+        output: what to differentiate, one of:
+            * 'loss' (default): the loss accumulator
+            * a column name of the output rays, for example 'image' after an ImagePlane
+            * a function OpticalData -> Tensor, for example a spot size
+        parameters: list of parameter names (default: all)
+        vectorize: how tangents are pushed through the stack:
+            * True: torch.func.jacfwd, all tangents in a single vmapped
+              forward pass. Elements must be supported by vmap.
+            * False: one dual number forward pass per scalar parameter
+              value, so the cost grows linearly with the number of
+              parameters.
+            * None (default): vectorized, falling back to one pass per
+              scalar parameter value if vmap fails.
+
+    Returns:
+        Sensitivity
+    """
+
+    params = select_parameters(optics, parameters)
+    fn = output_function(output)
+
+    def forward(*tensors):
+        with substitute_parameters(optics, {p: t for (_, p), t in zip(params, tensors)}):
+            return fn(optics(default_input, sampling))
+
+    primals = tuple(p.detach() for _, p in params)
+
+    if vectorize or vectorize is None:
+        try:
+            jac = torch.func.jacfwd(forward, argnums=tuple(range(len(primals))))(*primals)
+        except RuntimeError:
+            if vectorize:
+                raise
+        else:
+            with torch.no_grad():
+                value = forward(*primals)
+            return Sensitivity(value, {n: j for (n, _), j in zip(params, jac)})
+
+    value = None
+    columns = []
+    for i, primal in enumerate(primals):
+        for j in range(primal.numel()):
+            tangent = torch.zeros_like(primal)
+            tangent.view(-1)[j] = 1.0
+
+            with fwAD.dual_level():
+                duals = tuple(
+                    fwAD.make_dual(p, tangent) if k == i else p
+                    for k, p in enumerate(primals)
+                )
+                out = fwAD.unpack_dual(forward(*duals))
+
+            value = out.primal if value is None else value
+            columns.append(
+                out.tangent if out.tangent is not None else torch.zeros_like(out.primal)
+            )
+
+    # Assemble one jacobian block per parameter
+    blocks, offset = {}, 0
+    for (name, p) in params:
+        n = p.numel()
+        block = torch.stack(columns[offset : offset + n], dim=-1)
+        blocks[name] = block.reshape((*value.shape, *p.shape))
+        offset += n
+
+    return Sensitivity(value, blocks)
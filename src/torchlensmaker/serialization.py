@@ -0,0 +1,61 @@
+import torch
+
+
+# Version of the file format written by save_system()
+format_version = 1
+
+
+def system_state(optics):
+    """
+    Serializable state of an optical system
+
+    Systems built from a config (see build_system()) are described by their
+    config and state dict, which only contain plain values and tensors and are
+    stable across library versions. Other systems are stored as a whole
+    pickled module.
+    """
+
+    config = getattr(optics, "config", None)
+    if config is not None:
+        return {"format": format_version, "config": config, "state_dict": optics.state_dict()}
+    else:
+        return {"format": format_version, "module": optics}
+
+
+def save_system(optics, path):
+    "Save an optical system to a file, see system_state()"
+
+    torch.save(system_state(optics), path)
+
+
+def load_system(path, optics=None):
+    """
+    Load an optical system saved with save_system()
+
+    Files are unpickled, so only load files you trust.
+
+    Args:
+        optics: optional system with the same structure as the saved one, for
+            example rebuilt by the code that created it. If given, the saved
+            parameters are loaded into it, in place.
+
+    Returns:
+        the optical system
+    """
+
+    from torchlensmaker.config import build_system
+
+    state = torch.load(path, weights_only=False)
+
+    if state.get("format") != format_version:
+        raise ValueError(f"Unsupported optical system file format {state.get('format')}, expected {format_version}")
+
+    if optics is None and "config" in state:
+        optics, _ = build_system(state["config"])
+
+    if optics is None:
+        return state["module"]
+
+    saved = state["state_dict"] if "state_dict" in state else state["module"].state_dict()
+    optics.load_state_dict(saved)
+    return optics
@@ -27,5 +27,20 @@ class BaseShape:
         "Normal vectors at the given parametric locations"
         raise NotImplementedError
 
+    def vertex_curvature(self):
+        """
+        Signed curvature at the origin, used by paraxial optics.
+        Positive if the shape bends towards the positive X axis.
+        """
+        raise NotImplementedError
+
+    def quartic_coefficient(self):
+        """
+        Coefficient b of the Taylor expansion x = c/2 y^2 + b y^4 at the origin,
+        used by third order aberrations. By default the shape is assumed to
+        be spherical near its vertex, i.e. b = c^3 / 8.
+        """
+        return self.vertex_curvature() ** 3 / 8
+
     def collide(self, lines):
         raise NotImplementedError
@@ -255,6 +255,14 @@ class BezierSpline(BaseShape):
         normal = torch.stack((-deriv[:, 1], deriv[:, 0]), dim=-1)
         return normal / torch.linalg.vector_norm(normal, dim=1).view((-1, 1))
 
+    def vertex_curvature(self):
+        # At t = 0, the first derivative is (0, 3*CY[0]) and the second
+        # derivative is (6*P2x, ...) where P2 is the third control point of
+        # the first interval, i.e. the mirror of (CX[1], CY[1]) around the knot
+        X, Y, CX, CY = self.coefficients()
+        p2x = 2 * X[1] - CX[1]
+        return 2 * p2x / (3 * CY[0] ** 2)
+
     def newton_init(self, size):
         return torch.zeros(size)
     
@@ -77,6 +77,9 @@ class CircularArc(BaseShape):
         normal = torch.stack((-deriv[:, 1], deriv[:, 0]), dim=-1)
         return normal / torch.linalg.vector_norm(normal, dim=1).view((-1, 1))
 
+    def vertex_curvature(self):
+        return self._K
+
     def newton_init(self, size):
         return torch.full(size, 0.)
 
@@ -27,6 +27,12 @@ class Line(BaseShape):
     def normal(self, points):
         return torch.tile(torch.tensor([1., 0.]), (points.shape[0], 1))
 
+    def vertex_curvature(self):
+        return torch.tensor(0.)
+
+    def quartic_coefficient(self):
+        return torch.tensor(0.)
+
     def intersect_batch(self, lines):
         """
         Intersect with multiple lines where lines is a tensor of shape (N, 3) 
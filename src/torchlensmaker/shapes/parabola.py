@@ -46,6 +46,12 @@ class Parabola(BaseShape):
         )
         return normals / torch.norm(normals, dim=1, keepdim=True)
 
+    def vertex_curvature(self):
+        return 2 * self.coefficients()
+
+    def quartic_coefficient(self):
+        return torch.zeros_like(self.coefficients())
+
     def newton_init(self, size):
         return torch.full(size, 0.)
 
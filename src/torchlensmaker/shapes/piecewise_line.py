@@ -84,6 +84,11 @@ class PiecewiseLine(BaseShape):
         X = interp1d(cY, cX, Y)
         return torch.stack([X, Y], dim=-1)
 
+    def vertex_curvature(self):
+        # Curvature of the parabola through the origin and the first connection point
+        y1 = self.height / 2 / self._X.shape[0]
+        return 2 * self._X[0] / y1**2
+
     def interval_index(self, ys):
         """
         Given Y coordinates of points ys
@@ -0,0 +1,130 @@
+import torch
+
+from dataclasses import dataclass
+from typing import Iterable
+
+from torchlensmaker.raytracing import ray_plane_intersection
+from torchlensmaker.optics import ray_weights, mirror_pupil
+
+
+def group_rays(rays, by: Iterable[str]):
+    """
+    Group rays by the unique values of some columns, typically the field
+    coordinate 'object' and 'wavelength'. Columns not present are ignored.
+
+    Returns: (columns, keys, groups)
+        columns: list of the column names used for grouping
+        keys: tensor of shape (G, len(columns)), unique values of each group
+        groups: tensor of shape (N,), index of the group of each ray
+    """
+
+    columns = [c for c in by if c in rays.columns]
+    N = rays.shape[0]
+
+    if len(columns) == 0:
+        return columns, torch.empty((1, 0)), torch.zeros(N, dtype=torch.long)
+
+    keys, groups = torch.unique(rays.get(columns).detach(), dim=0, return_inverse=True)
+    return columns, keys, groups
+
+
+def segment_sum(values, groups, num_groups):
+    "Differentiable sum of values for each group"
+
+    return torch.zeros(num_groups, dtype=values.dtype).index_add(0, groups, values)
+
+
+@dataclass
+class SpotData:
+    """
+    Spot diagram analysis of rays on an image plane
+
+    All per group tensors are indexed like keys.
+    """
+
+    # Names of the columns used for grouping rays
+    columns: list
+
+    # Unique values of grouping columns, shape (G, len(columns))
+    keys: torch.Tensor
+
+    # Group index of each ray, shape (N,)
+    groups: torch.Tensor
+
+    # Image plane coordinate of each ray, shape (N,)
+    positions: torch.Tensor
+
+    # Weight of each ray, shape (N,)
+    weights: torch.Tensor
+
+    # Weighted centroid, RMS radius and geometric (maximum) radius of each group, shape (G,)
+    centroid: torch.Tensor
+    rms: torch.Tensor
+    radius: torch.Tensor
+
+    # Encircled energy: fraction of the energy of each group within each
+    # radius, shape (G, K)
+    ee_radii: torch.Tensor
+    encircled_energy: torch.Tensor
+
+
+def spot_diagram(outputs, x=None, by=("object", "wavelength"), radii=None):
+    """
+    Spot diagram metrics of output rays, for all field points at once
+
+    Rays are intersected with the image plane X = x and grouped by the
+    unique values of the 'by' columns. Per group reductions are computed with
+    segment sums, so the cost doesn't depend on the number of groups.
+
+    Args:
+        outputs: OpticalData, typically the output of an optical stack
+        x: position of the image plane on the principal axis
+            (default: the output target, i.e. the position of the last element)
+        by: columns identifying a field point
+        radii: tensor of shape (K,) of radii to evaluate encircled energy at
+            (default: 50 radii up to the largest geometric radius)
+
+    Returns:
+        SpotData
+    """
+
+    rays = mirror_pupil(outputs.rays)
+    if x is None:
+        x = outputs.target[0]
+
+    positions = ray_plane_intersection(rays.get(["RX", "RY"]), rays.get(["VX", "VY"]), x)
+    weights = ray_weights(rays)
+
+    columns, keys, groups = group_rays(rays, by)
+    G = keys.shape[0]
+
+    total = segment_sum(weights, groups, G)
+    centroid = segment_sum(weights * positions, groups, G) / total
+
+    distance = torch.abs(positions - centroid[groups])
+    rms = torch.sqrt(segment_sum(weights * distance**2, groups, G) / total)
+    radius = torch.zeros(G, dtype=distance.dtype).scatter_reduce(
+        0, groups, distance, reduce="amax", include_self=False
+    )
+
+    # Encircled energy with a histogram over radii bins
+    # The extra last bin collects rays beyond the largest radius
+    if radii is None:
+        radii = torch.linspace(0, radius.detach().max().item(), 50)
+    K = radii.shape[0]
+    bins = torch.bucketize(distance.detach(), radii)
+    hist = torch.zeros(G * (K + 1), dtype=weights.dtype).index_add(0, groups * (K + 1) + bins, weights.detach())
+    encircled_energy = torch.cumsum(hist.view(G, K + 1)[:, :K], dim=1) / total.detach().unsqueeze(1)
+
+    return SpotData(
+        columns=columns,
+        keys=keys,
+        groups=groups,
+        positions=positions,
+        weights=weights,
+        centroid=centroid,
+        rms=rms,
+        radius=radius,
+        ee_radii=radii,
+        encircled_energy=encircled_energy,
+    )
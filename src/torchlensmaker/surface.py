@@ -78,6 +78,14 @@ class Surface:
 
         return self.pos - self.anchor_offset(self.anchor)
 
+    def vertex_curvature(self):
+        "Signed curvature of the shape at its origin, in absolute space"
+        return self.shape.vertex_curvature() * self.scale[0]
+
+    def quartic_coefficient(self):
+        "Fourth order coefficient of the shape at its origin, in absolute space"
+        return self.shape.quartic_coefficient() * self.scale[0]
+
     def evaluate(self, ts):
         "Convert the inner shape evaluate() to absolute space"
         relative_points = self.shape.evaluate(ts) * self.scale
@@ -0,0 +1,175 @@
+import itertools
+import json
+import os
+import numpy as np
+import torch
+
+from concurrent.futures import ProcessPoolExecutor
+
+from torchlensmaker.evolution import select_parameters, evaluate_population
+
+
+def expand_grid(grid):
+    """
+    Cartesian product of a grid
+
+    Args:
+        grid: dict of name -> list of values
+
+    Returns:
+        list of dicts of name -> value, with the last name varying fastest
+    """
+
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def shard_path(output_dir, index):
+    return os.path.join(output_dir, f"shard_{index:05d}.npz")
+
+
+def evaluate_shard(build, arguments, parameters, points, sampling=None, regularization=None):
+    """
+    Evaluate the loss of a list of grid points
+
+    Consecutive points with the same build arguments share one system, and
+    their parameter values are evaluated without rebuilding it.
+
+    Returns:
+        numpy array of losses, shape (len(points),)
+    """
+
+    losses = np.empty(len(points))
+    names = list(parameters.keys())
+
+    for values, group in itertools.groupby(enumerate(points), key=lambda p: tuple(p[1][n] for n in arguments)):
+        group = list(group)
+        optics, built_sampling = build(**dict(zip(arguments, values)))
+        params = select_parameters(optics, names)
+
+        if len(names) > 0:
+            candidates = torch.tensor([[point[n] for n in names] for _, point in group], dtype=torch.float64)
+        else:
+            candidates = torch.empty((len(group), 0), dtype=torch.float64)
+
+        group_losses = evaluate_population(optics, sampling or built_sampling, params, candidates, regularization)
+        for (i, _), loss in zip(group, group_losses):
+            losses[i] = loss.item()
+
+    return losses
+
+
+def run_shard(job):
+    "Evaluate and write one shard of a sweep"
+
+    build, arguments, parameters, points, index, output_dir, sampling, regularization = job
+
+    losses = evaluate_shard(build, arguments, parameters, points, sampling, regularization)
+
+    columns = {name: np.array([point[name] for point in points]) for name in points[0]}
+    columns["loss"] = losses
+
+    # Write to a temporary file first so that an interrupted sweep never leaves a partial shard
+    path = shard_path(output_dir, index)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **columns)
+    os.replace(tmp, path)
+    return index
+
+
+def sweep(
+    build,
+    output_dir,
+    arguments=None,
+    parameters=None,
+    sampling=None,
+    regularization=None,
+    shard_size=256,
+    workers=1,
+):
+    """
+    Evaluate the loss of an optical system over a grid of values
+
+    The grid is the cartesian product of build arguments and parameter
+    values. Points are evaluated by shards of shard_size, and each shard is
+    written to output_dir as a .npz file with one column per grid name and a
+    'loss' column, as soon as it's done. Running the same sweep again resumes
+    it: shards already on disk are skipped.
+
+    Systems are built once per combination of build arguments, and all
+    parameter values of that combination are evaluated on the same system
+    without autograd. With workers > 1, shards are evaluated by a pool of
+    worker processes, so build and regularization must be picklable (for
+    example, module level functions).
+
+    Args:
+        build: function of the build arguments returning (optics, sampling)
+        output_dir: directory of the result shards
+        arguments: dict of build argument name -> list of values, for
+            quantities that need rebuilding the system (indices, beam size)
+        parameters: dict of parameter name -> list of values, for scalar
+            parameters of the built system (see optics.named_parameters())
+        sampling: sampling dict overriding the one returned by build
+        regularization: optional function optics -> loss term
+        shard_size: number of grid points per shard
+        workers: number of worker processes
+
+    Returns:
+        dict of column name -> numpy array, see load_sweep()
+    """
+
+    arguments = dict(arguments or {})
+    parameters = dict(parameters or {})
+
+    overlap = set(arguments) & set(parameters)
+    if overlap:
+        raise ValueError(f"Names {overlap} are both build arguments and parameters")
+
+    points = expand_grid({**arguments, **parameters})
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Refuse to resume a different sweep into the same directory
+    metadata = {"arguments": arguments, "parameters": parameters, "shard_size": shard_size}
+    metadata_path = os.path.join(output_dir, "sweep.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            if json.load(f) != json.loads(json.dumps(metadata)):
+                raise ValueError(f"{output_dir} contains the results of a different sweep")
+    else:
+        with open(metadata_path, "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    jobs = [
+        (build, list(arguments), parameters, points[start : start + shard_size], index, output_dir, sampling, regularization)
+        for index, start in enumerate(range(0, len(points), shard_size))
+        if not os.path.exists(shard_path(output_dir, index))
+    ]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run_shard, jobs))
+    else:
+        for job in jobs:
+            run_shard(job)
+
+    return load_sweep(output_dir)
+
+
+def load_sweep(output_dir):
+    """
+    Load the results of a sweep, possibly incomplete
+
+    Returns:
+        dict of column name -> numpy array, concatenated over all shards in
+        grid order
+    """
+
+    names = sorted(n for n in os.listdir(output_dir) if n.startswith("shard_") and n.endswith(".npz") and ".tmp" not in n)
+
+    columns = {}
+    for name in names:
+        with np.load(os.path.join(output_dir, name)) as shard:
+            for column in shard.files:
+                columns.setdefault(column, []).append(shard[column])
+
+    return {column: np.concatenate(values) for column, values in columns.items()}
@@ -0,0 +1,184 @@
+import torch
+
+from dataclasses import dataclass
+
+from torchlensmaker.evolution import (
+    select_parameters,
+    parameters_to_vector,
+    evaluate_population,
+)
+from torchlensmaker.parallel import SystemPool
+
+
+@dataclass
+class Tolerance:
+    """
+    Manufacturing tolerance of a parameter, modeled as a random additive
+    perturbation of its nominal value
+
+    distribution:
+        * 'normal' (default): width is the standard deviation
+        * 'uniform': width is the half range, i.e. perturbations are in [-width, width]
+
+    relative: if True, width is relative to the absolute nominal value
+    """
+
+    width: float
+    distribution: str = "normal"
+    relative: bool = False
+
+    def sample(self, nominal, num_trials, generator):
+        "Sample perturbations for a nominal value tensor, shape (num_trials, *nominal.shape)"
+
+        shape = (num_trials, *nominal.shape)
+        if self.distribution == "normal":
+            u = torch.randn(shape, dtype=torch.float64, generator=generator)
+        elif self.distribution == "uniform":
+            u = 2 * torch.rand(shape, dtype=torch.float64, generator=generator) - 1
+        else:
+            raise ValueError(
+                f"distribution must be one of 'normal', 'uniform'. Got {repr(self.distribution)}."
+            )
+
+        width = self.width * nominal.abs() if self.relative else torch.full_like(nominal, self.width)
+        return u * width
+
+
+@dataclass
+class ToleranceResult:
+    "Loss distribution of a design under random perturbations"
+
+    # Names of perturbed parameters
+    names: list
+
+    # Number of scalar values in each parameter
+    sizes: list
+
+    # Loss of the unperturbed design
+    nominal_loss: float
+
+    # Perturbations of each trial, shape (T, D)
+    perturbations: torch.Tensor
+
+    # Loss of each trial, shape (T,). Trials where no ray reaches the loss are +inf
+    losses: torch.Tensor
+
+    def failed(self):
+        "Mask of trials with a non finite loss"
+        return ~torch.isfinite(self.losses)
+
+    def succeeded(self):
+        "Losses of trials with a finite loss"
+        return self.losses[~self.failed()]
+
+    # Statistics are over trials with a finite loss, and nan if all trials failed
+
+    def mean(self):
+        losses = self.succeeded()
+        return losses.mean().item() if losses.numel() > 0 else float("nan")
+
+    def std(self):
+        losses = self.succeeded()
+        return losses.std().item() if losses.numel() > 1 else float("nan")
+
+    def quantile(self, q):
+        losses, q = self.succeeded(), torch.as_tensor(q, dtype=torch.float64)
+        if losses.numel() == 0:
+            return torch.full_like(q, float("nan"))
+        return torch.quantile(losses, q)
+
+    def perturbation(self, trial):
+        "Perturbations of one trial, as a dict of parameter name -> tensor"
+
+        chunks = torch.split(self.perturbations[trial], self.sizes)
+        return {n: c for n, c in zip(self.names, chunks)}
+
+    def worst(self, k=10):
+        "Indices of the k trials with the highest loss"
+        return torch.argsort(self.losses, descending=True)[:k]
+
+    def summary(self):
+        q50, q90, q99 = self.quantile([0.5, 0.9, 0.99]).tolist()
+        print(f"trials: {self.losses.numel()} | failed: {self.failed().sum().item()}")
+        print(f"nominal loss: {self.nominal_loss:.4g}")
+        print(f"mean: {self.mean():.4g} | std: {self.std():.4g}")
+        print(f"median: {q50:.4g} | 90%: {q90:.4g} | 99%: {q99:.4g}")
+        print("worst trials:")
+        for trial in self.worst(5).tolist():
+            deltas = ", ".join(
+                f"{n}={v.tolist()}" for n, v in self.perturbation(trial).items()
+            )
+            print(f"  [{trial:>5}] L= {self.losses[trial].item():.4g} | {deltas}")
+
+
+def tolerance(
+    optics,
+    sampling,
+    tolerances,
+    num_trials=1000,
+    chunk_size=256,
+    regularization=None,
+    seed=None,
+    workers=1,
+):
+    """
+    Monte Carlo tolerancing of an optical stack
+
+    Draws num_trials perturbed designs, evaluates their loss and returns the
+    loss distribution. Each trial is one forward pass without autograd
+    bookkeeping (see evaluate_population()), and the nominal parameters are
+    restored afterwards. Trials are split into chunks of chunk_size, which
+    with workers > 1 is the unit of work sent to worker processes.
+
+    Args:
+        tolerances: dict of parameter name -> Tolerance, or a float which is
+            the standard deviation of a normal perturbation. Thickness and
+            decenter tolerances apply to Gap offsets and surface decenters,
+            which must be nn.Parameter to be perturbed.
+        seed: optional seed of the random number generator
+        workers: number of worker processes evaluating chunks, see SystemPool
+    """
+
+    tolerances = {
+        n: t if isinstance(t, Tolerance) else Tolerance(t)
+        for n, t in tolerances.items()
+    }
+
+    params = select_parameters(optics, list(tolerances.keys()))
+    nominal = parameters_to_vector(params).to(dtype=torch.float64)
+
+    generator = torch.Generator()
+    if seed is not None:
+        generator.manual_seed(seed)
+    else:
+        generator.seed()
+
+    # Sample all perturbations up front, so that results don't depend on chunk size
+    perturbations = torch.cat(
+        [
+            tolerances[n].sample(p.detach().to(dtype=torch.float64), num_trials, generator).reshape(num_trials, -1)
+            for n, p in params
+        ],
+        dim=1,
+    )
+
+    nominal_loss = evaluate_population(optics, sampling, params, nominal.unsqueeze(0), regularization)[0].item()
+
+    if workers > 1:
+        with SystemPool(optics, sampling, [n for n, _ in params], regularization, workers) as pool:
+            losses = torch.cat([pool.evaluate(nominal + chunk) for chunk in torch.split(perturbations, chunk_size)])
+    else:
+        losses = torch.cat(
+            [
+                evaluate_population(optics, sampling, params, nominal + chunk, regularization)
+                for chunk in torch.split(perturbations, chunk_size)
+            ]
+        )
+
+    return ToleranceResult(
+        names=[n for n, _ in params],
+        sizes=[p.numel() for _, p in params],
+        nominal_loss=nominal_loss,
+        perturbations=perturbations,
+        losses=losses,
+    )
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import weakref
 
 from dataclasses import dataclass
 from typing import Any
@@ -9,14 +10,208 @@ from typing import Any
 Parameter = nn.Parameter
 
 
+# Parameters whose requires_grad was turned off by freeze()
+_frozen_parameters = weakref.WeakSet()
+
+
+def freeze(module):
+    """
+    Freeze a module: its parameters stop requiring grad, and when its inputs
+    don't require grad either, OpticalSequence evaluates it under no_grad.
+    Gradients then only flow from the first trainable element onward.
+
+    Works with any module of an optical stack: elements, lenses and sequences.
+    """
+
+    for parameter in module.parameters():
+        if parameter.requires_grad:
+            parameter.requires_grad_(False)
+            _frozen_parameters.add(parameter)
+    for mod in module.modules():
+        mod._frozen = True
+    return module
+
+
+def unfreeze(module):
+    """
+    Undo freeze(): parameters of the module that were made non trainable by
+    freeze() require grad again. Parameters that didn't require grad before
+    freezing are left as they are.
+    """
+
+    for parameter in module.parameters():
+        if parameter in _frozen_parameters:
+            parameter.requires_grad_(True)
+            _frozen_parameters.discard(parameter)
+    for mod in module.modules():
+        mod._frozen = False
+    return module
+
+
+def is_frozen(module):
+    "True if the module was frozen and none of its parameters require grad"
+
+    return module.__dict__.get("_frozen", False) and not any(p.requires_grad for p in module.parameters())
+
+
+def call_element(module, inputs, sampling):
+    "Evaluate an element of an optical sequence, under no_grad if it is frozen and its inputs don't require grad"
+
+    if is_frozen(module) and not any(t.requires_grad for t in (inputs.rays.data, inputs.target, inputs.loss)):
+        with torch.no_grad():
+            return module(inputs, sampling)
+    return module(inputs, sampling)
+
+
+def shape_tensors(shape):
+    "Tensor attributes of a shape, parameters or not"
+
+    return [value for value in vars(shape).values() if isinstance(value, torch.Tensor)]
+
+
+def frozen_state(module):
+    """
+    State of a module that can't change its forward outputs, or None if any of
+    its parameters requires grad
+
+    The state is made of the identity and version counter of all parameters
+    and buffers, the identity of the public attributes and shapes of the
+    module and its submodules, and the versions of shape tensors. Returns
+    (state, refs) where refs must be kept alive as long as state is used, so
+    that ids can't be reused by other objects.
+    """
+
+    state, refs = [], []
+    for mod in module.modules():
+        for tensor in list(mod._parameters.values()) + list(mod._buffers.values()):
+            if tensor is None:
+                continue
+            if tensor.requires_grad:
+                return None
+            state.append((id(tensor), tensor._version))
+            refs.append(tensor)
+
+        for name, value in mod.__dict__.items():
+            if name.startswith("_") or name == "training":
+                continue
+            state.append((name, id(value), value._version if isinstance(value, torch.Tensor) else None))
+            refs.append(value)
+
+        # Shapes of tlm.Module are stored privately, and can hold tensors that are not parameters
+        for name, shape in mod.__dict__.get("_shapes", {}).items():
+            state.append((name, id(shape)))
+            refs.append(shape)
+            for tensor in shape_tensors(shape):
+                state.append((id(tensor), tensor._version))
+                refs.append(tensor)
+
+    return tuple(state), refs
+
+
+def has_forward_hooks(module):
+    "True if forward hooks are registered on the module, its submodules or globally"
+
+    global_hooks = getattr(nn.modules.module, "_global_forward_hooks", {})
+    global_pre_hooks = getattr(nn.modules.module, "_global_forward_pre_hooks", {})
+    return bool(global_hooks or global_pre_hooks) or any(
+        mod._forward_hooks or mod._forward_pre_hooks for mod in module.modules()
+    )
+
+
 # Custom version of nn.Sequential that takes additional read only sampling info
 class OpticalSequence(nn.Sequential):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._prefix_cache = None
+
+    def enable_cache(self, enabled=True):
+        """
+        Enable caching of the outputs of the leading elements of the sequence
+
+        When the leading elements of the sequence have no parameter that
+        requires grad and none of their parameters, attributes or shapes
+        changed, their outputs for the same inputs object and sampling are
+        reused across calls, and only the remaining elements are evaluated.
+        This makes optimizing only the last elements of a system, with the
+        others frozen, proportionally cheaper.
+
+        The cache is bypassed when forward hooks are registered, for example
+        by full_forward(), so that every element is evaluated.
+        """
+
+        self._prefix_cache = [] if enabled else None
+        return self
+
+    def __getstate__(self):
+        # Cached states are made of object ids which are meaningless in another
+        # process or copy, so the cache is emptied (but stays enabled)
+        state = self.__dict__.copy()
+        if state.get("_prefix_cache") is not None:
+            state["_prefix_cache"] = []
+        return state
+
     def forward(self, inputs, sampling):
-        for module in self._modules.values():
-            inputs = module(inputs, sampling)
+        # Half pupil sampling is only exact for axisymmetric systems
+        if sampling.get("symmetry", False) and not is_axisymmetric(self):
+            sampling = dict(sampling, symmetry=False)
+
+        if self._prefix_cache is None or has_forward_hooks(self):
+            for module in self._modules.values():
+                inputs = call_element(module, inputs, sampling)
+            return inputs
+
+        cache = self._prefix_cache
+        for i, module in enumerate(self._modules.values()):
+            frozen = frozen_state(module)
+
+            if i < len(cache):
+                state, _, cached_inputs, cached_sampling, outputs = cache[i]
+                if frozen is not None and frozen[0] == state and cached_inputs is inputs and cached_sampling == sampling:
+                    inputs = outputs
+                    continue
+
+                # Element or its inputs changed: invalidate it and all following elements
+                del cache[i:]
+
+            outputs = call_element(module, inputs, sampling)
+            if frozen is not None and len(cache) == i:
+                cache.append((frozen[0], frozen[1], inputs, dict(sampling), outputs))
+            inputs = outputs
+
         return inputs
 
 
+def flatten_sequence(module):
+    """
+    List of the leaf optical elements of a model, in execution order
+
+    Nested OpticalSequence are flattened, as well as modules that delegate
+    their forward to an OpticalSequence stored in their 'optics' attribute,
+    like lenses.
+    """
+
+    if isinstance(module, OpticalSequence):
+        return [leaf for child in module for leaf in flatten_sequence(child)]
+
+    optics = getattr(module, "optics", None)
+    if isinstance(optics, OpticalSequence):
+        return flatten_sequence(optics)
+
+    return [module]
+
+
+def is_axisymmetric(module):
+    """
+    True if all elements of the optical stack are symmetric around the
+    principal axis. All shapes are symmetric, but surfaces can be decentered.
+    """
+
+    return all(
+        torch.all(torch.as_tensor(getattr(element, "decenter", 0.)) == 0)
+        for element in flatten_sequence(module)
+    )
+
+
 @dataclass
 class ForwardContext:
     module: nn.Module
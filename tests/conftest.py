@@ -0,0 +1,49 @@
+import pytest
+import torch
+import torchlensmaker as tlm
+
+
+@pytest.fixture
+def config():
+    "Config of a small optimizable system with one lens, see torchlensmaker.config"
+
+    return {
+        "system": [
+            {"type": "PointSourceAtInfinity", "beam_diameter": 10},
+            {"type": "Gap", "offset": 5},
+            {"type": "SymmetricLens", "name": "lens", "n": [1.0, 1.5], "outer_thickness": 1.0,
+             "shape": {"type": "Parabola", "height": 15, "a": {"param": 0.02}}},
+            {"type": "Gap", "offset": {"param": 20.0}},
+            {"type": "FocalPoint"},
+        ],
+        "sampling": {"rays": 10},
+        "optimizer": {"type": "Adam", "lr": 1e-3, "num_iter": 5},
+        "regularization": [{"type": "inner_thickness", "element": "lens", "target": 1.5}],
+    }
+
+
+@pytest.fixture
+def lens_system():
+    """
+    Factory of a small system focusing a beam at infinity with one lens, the
+    same as the config fixture: source, gap, lens, gap, focal point. The lens
+    shape coefficient and the last gap are parameters.
+
+    With an aperture diameter, an aperture and a gap are inserted after the
+    first gap.
+    """
+
+    def make(n=1.5, offset=20., aperture=None):
+        elements = [tlm.PointSourceAtInfinity(beam_diameter=10.), tlm.Gap(5.)]
+        if aperture is not None:
+            elements += [tlm.Aperture(height=30, diameter=aperture), tlm.Gap(5.)]
+
+        shape = tlm.Parabola(height=15., a=tlm.Parameter(torch.tensor(0.02)))
+        elements += [
+            tlm.SymmetricLens(shape, (1.0, n), outer_thickness=1.0),
+            tlm.Gap(tlm.Parameter(torch.tensor(offset))),
+            tlm.FocalPoint(),
+        ]
+        return tlm.OpticalSequence(*elements)
+
+    return make
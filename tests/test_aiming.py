@@ -0,0 +1,55 @@
+import math
+import pytest
+import torch
+import torchlensmaker as tlm
+
+
+def make_optics(angular_size):
+    shape1 = tlm.CircularArc(height=30, r=25.)
+    shape2 = tlm.CircularArc(height=30, r=65.)
+
+    return tlm.OpticalSequence(
+        tlm.ObjectAtInfinity(beam_diameter=40, angular_size=angular_size),
+        tlm.Gap(15),
+        tlm.AsymmetricLens(shape1, shape2, (1.0, 1.5), outer_thickness=3.),
+        tlm.Gap(20),
+        tlm.Aperture(height=50, diameter=10),
+        tlm.Gap(100),
+        tlm.ImagePlane(height=100),
+    )
+
+
+def test_aim_rays_fills_stop():
+    optics = make_optics(20)
+    sampling = {"rays": 10, "object": 5}
+
+    # Without aiming, many rays are blocked by the stop
+    before = optics(tlm.default_input, sampling)
+    assert before.rays.shape[0] < 50
+
+    error = tlm.aim_rays(optics, sampling)
+    assert error < 1e-3
+
+    # With aiming, all rays go through the stop
+    after = optics(tlm.default_input, sampling)
+    assert after.rays.shape[0] == 50
+    assert torch.all(torch.isfinite(after.loss))
+
+    # Aims are only valid for the sampling they were computed with
+    for other in ({"rays": 10, "object": 3}, {"rays": 10, "object": 7}, {"rays": 12, "object": 5}):
+        with pytest.raises(ValueError, match="aim_rays"):
+            optics(tlm.default_input, other)
+
+
+def test_aim_rays_vignetted():
+    # At the edge of a 40 degrees field, the lens rim blocks rays aimed at the
+    # top of the stop, so their targets can't be reached
+    optics = make_optics(40)
+    sampling = {"rays": 10, "object": 5}
+
+    error = tlm.aim_rays(optics, sampling)
+    assert 1e-3 < error < math.inf
+
+    # Rays are left at their closest reachable aim, so they all still go through the stop
+    after = optics(tlm.default_input, sampling)
+    assert after.rays.shape[0] == 50
@@ -0,0 +1,36 @@
+import pytest
+import torch
+import torchlensmaker as tlm
+
+
+def make(config):
+    optics, sampling = tlm.build_system(config)
+    optimizer = torch.optim.Adam(optics.parameters(), lr=1e-3)
+    return optics, optimizer, sampling
+
+
+def test_resume_is_exact(config, tmp_path):
+    optics, optimizer, sampling = make(config)
+    expected = tlm.run_optimization(optics, optimizer, sampling, 10, nshow=0)
+
+    # Interrupt a run after 6 iterations, with checkpoints every 4
+    calls = []
+
+    def interrupt(optics):
+        calls.append(None)
+        if len(calls) > 6:
+            raise KeyboardInterrupt()
+        return 0.0
+
+    path = tmp_path / "checkpoint.pt"
+    optics, optimizer, sampling = make(config)
+    with pytest.raises(KeyboardInterrupt):
+        tlm.run_optimization(optics, optimizer, sampling, 10, nshow=0, regularization=interrupt, checkpoint=path, checkpoint_every=4)
+
+    # Resume in a fresh system
+    optics, optimizer, sampling = make(config)
+    record = tlm.run_optimization(optics, optimizer, sampling, 10, nshow=0, checkpoint=path, checkpoint_every=4, resume=path)
+
+    assert torch.equal(record.loss, expected.loss)
+    for n, values in expected.parameters.items():
+        assert torch.equal(record.parameters[n], values)
@@ -0,0 +1,29 @@
+import json
+import torch
+import torchlensmaker as tlm
+
+from torchlensmaker.config import build_optimizer, build_regularization
+from torchlensmaker.cli import main
+
+
+def test_build_system(config):
+    optics, sampling = tlm.build_system(config)
+
+    assert sampling == {"rays": 10}
+    assert set(dict(optics.named_parameters()).keys()) == {"lens.shape_a", "3.offset"}
+    assert torch.isfinite(optics(tlm.default_input, sampling).loss)
+
+    optimizer, num_iter = build_optimizer(config, optics)
+    assert isinstance(optimizer, torch.optim.Adam) and num_iter == 5
+    assert build_regularization(config)(optics) >= 0
+
+
+def test_cli(config, tmp_path):
+    path = tmp_path / "design.json"
+    path.write_text(json.dumps(config))
+
+    assert main(["optimize", str(path), "--output", str(tmp_path / "out")]) == 0
+
+    results = json.loads((tmp_path / "out" / "design" / "results.json").read_text())
+    assert len(results["loss_history"]) == 5
+    assert "lens.shape_a" in results["parameters"]
@@ -0,0 +1,39 @@
+import torch
+import torchlensmaker as tlm
+
+
+def test_cmaes_sphere():
+    center = torch.tensor([1.0, -2.0, 0.5], dtype=torch.float64)
+    es = tlm.CMAES(torch.zeros(3), 1.0, generator=torch.Generator().manual_seed(0))
+
+    for _ in range(100):
+        candidates = es.ask()
+        es.tell(candidates, ((candidates - center) ** 2).sum(dim=1))
+
+    assert torch.allclose(es.mean, center, atol=1e-3)
+
+
+def test_cmaes_focus(lens_system):
+    # Find the focal distance of a lens by optimizing a single gap
+    optics = lens_system(offset=15.)
+    sampling = {"rays": 10}
+
+    # Reference minimum by scanning the gap
+    params = tlm.evolution.select_parameters(optics, ["3.offset"])
+    scan = torch.linspace(10., 40., 301, dtype=torch.float64).unsqueeze(1)
+    losses = tlm.evolution.evaluate_population(optics, sampling, params, scan)
+    expected = scan[torch.argmin(losses), 0]
+
+    record = tlm.cmaes(optics, sampling, 40, sigma=5.0, parameters=["3.offset"], seed=0, nshow=1)
+
+    assert abs(optics[3].offset.item() - expected.item()) < 0.2
+    assert record.best_loss <= losses.min().item() + 1e-6
+    assert record.loss_best[-1] <= record.loss_best[0]
+    assert record.num_evaluations == 1 + 40 * tlm.CMAES(torch.zeros(1), 1.0).popsize
+
+    # Evaluating generations in worker processes gives the same search
+    with torch.no_grad():
+        optics[3].offset.fill_(15.)
+    parallel = tlm.cmaes(optics, sampling, 40, sigma=5.0, parameters=["3.offset"], seed=0, nshow=1, workers=2)
+    assert torch.equal(parallel.loss_best, record.loss_best)
+    assert torch.equal(parallel.best, record.best)
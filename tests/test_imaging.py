@@ -0,0 +1,36 @@
+import math
+import torch
+import torchlensmaker as tlm
+
+
+def make_optics():
+    # Weak lens imaging an object at infinity at its rear focal point
+    lens = tlm.SymmetricLens(tlm.Parabola(height=15., a=0.005), (1.0, 1.5), outer_thickness=1.0)
+    system = tlm.paraxial(tlm.OpticalSequence(tlm.Gap(10.), lens))
+    back_focal_distance = (system.rear_focal_point - system.x_last).item()
+
+    optics = tlm.OpticalSequence(
+        tlm.ObjectAtInfinity(beam_diameter=2., angular_size=4.),
+        tlm.Gap(10.),
+        lens,
+        tlm.Gap(back_focal_distance),
+    )
+    return optics, system.efl.item()
+
+
+def test_simulate_image():
+    optics, efl = make_optics()
+    sampling = {"rays": 10, "object": 3}
+
+    # Uniform object: each object point carries unit energy, and no ray is blocked
+    image = tlm.simulate_image(optics, sampling, torch.ones_like, 400, 20.)
+    assert math.isclose(image.intensity.sum().item(), 3.0, rel_tol=1e-5)
+
+    # The source has a single wavelength whatever the sampling asks for
+    image = tlm.simulate_image(optics, dict(sampling, wavelength=3), torch.ones_like, 400, 20.)
+    assert math.isclose(image.intensity.sum().item(), 3.0, rel_tol=1e-5)
+
+    # Image of the 2 degrees object point is at efl * tan(2 degrees) from the axis
+    image = tlm.simulate_image(optics, sampling, lambda angle: (angle == 2.).float(), 400, 20.)
+    centroid = (image.positions * image.intensity).sum() / image.intensity.sum()
+    assert math.isclose(abs(centroid.item()), efl * math.tan(math.radians(2.)), rel_tol=0.02)
@@ -0,0 +1,15 @@
+import subprocess
+import sys
+
+
+def test_lazy_imports():
+    # Importing the package must not import plotting or CAD dependencies
+    code = (
+        "import sys, torchlensmaker as tlm\n"
+        "assert 'matplotlib' not in sys.modules, 'matplotlib imported'\n"
+        "assert 'build123d' not in sys.modules, 'build123d imported'\n"
+        "assert callable(tlm.render_plt)\n"
+        "assert 'matplotlib' in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,48 @@
+import torch
+import torchlensmaker as tlm
+
+
+def test_layout_matches_forward():
+    lens = tlm.SymmetricLens(tlm.Parabola(height=15., a=tlm.Parameter(torch.tensor(0.02))), (1.0, 1.5), outer_thickness=1.0)
+    optics = tlm.OpticalSequence(tlm.Gap(5.), lens, tlm.Gap(20.), tlm.FocalPoint())
+
+    execute_list, outputs = tlm.full_forward(optics, tlm.default_input, {"rays": 0, "object": 0})
+    targets = [ctx.inputs.target for ctx in execute_list if not isinstance(ctx.module, (tlm.OpticalSequence, tlm.SymmetricLens))]
+    layout = tlm.stack_layout(optics)
+
+    assert len(layout) == len(targets)
+    for entry, target in zip(layout, targets):
+        assert torch.allclose(entry.target, target)
+
+    # Outer thickness anchors the lens at its extent
+    assert torch.allclose(lens.outer_thickness(), torch.tensor(1.0))
+
+
+def test_layout_cache_invalidation():
+    a = tlm.Parameter(torch.tensor(0.02))
+    lens = tlm.SymmetricLens(tlm.Parabola(height=15., a=a), (1.0, 1.5), outer_thickness=1.0)
+
+    with torch.no_grad():
+        assert tlm.stack_layout(lens) is tlm.stack_layout(lens)
+        thickness = lens.inner_thickness()
+
+        # In place parameter updates invalidate the cached layout
+        a.add_(0.01)
+        assert not torch.allclose(lens.inner_thickness(), thickness)
+
+    # In place updates of non parameter shape tensors too
+    b = torch.tensor(0.02)
+    lens = tlm.SymmetricLens(tlm.Parabola(height=15., a=b), (1.0, 1.5), outer_thickness=1.0)
+    thickness = lens.inner_thickness()
+    b.add_(0.01)
+    assert not torch.allclose(lens.inner_thickness(), thickness)
+
+
+def test_layout_backward_twice():
+    a = tlm.Parameter(torch.tensor(0.02))
+    lens = tlm.SymmetricLens(tlm.Parabola(height=15., a=a), (1.0, 1.5), outer_thickness=1.0)
+
+    # Each call builds its own graph, without retain_graph
+    lens.inner_thickness().backward()
+    lens.inner_thickness().backward()
+    assert a.grad is not None
@@ -0,0 +1,39 @@
+import torch
+import torchlensmaker as tlm
+from torchlensmaker.raytracing import refraction
+
+
+def test_sellmeier_catalog_values():
+    d_line = torch.tensor(587.6)
+
+    assert torch.allclose(tlm.materials_table["BK7"].refractive_index(d_line), torch.tensor(1.5168), atol=1e-4)
+    assert torch.allclose(tlm.materials_table["fused-silica"].refractive_index(d_line), torch.tensor(1.4585), atol=1e-4)
+
+
+def test_dispersion_batched():
+    wavelengths = torch.linspace(400, 700, 5)
+    n = tlm.materials_table["BK7"].refractive_index(wavelengths)
+
+    # Normal dispersion: index decreases with wavelength
+    assert n.shape == (5,)
+    assert torch.all(torch.diff(n) < 0)
+
+
+def test_refraction_per_ray_indices():
+    rays = torch.nn.functional.normalize(torch.tensor([[1.0, 0.5], [1.0, 0.5]]), dim=1)
+    normals = torch.tensor([[-1.0, 0.0], [-1.0, 0.0]])
+    n2 = torch.tensor([1.5, 1.6])
+
+    batched = refraction(rays, normals, 1.0, n2, critical_angle="clamp")
+    first = refraction(rays[:1], normals[:1], 1.0, 1.5, critical_angle="clamp")
+    second = refraction(rays[1:], normals[1:], 1.0, 1.6, critical_angle="clamp")
+
+    assert torch.allclose(batched, torch.cat((first, second)))
+
+
+def test_source_wavelength_dimension():
+    source = tlm.PointSourceAtInfinity(beam_diameter=10., wavelength=(400, 700))
+    outputs = source(tlm.default_input, {"rays": 7, "wavelength": 3})
+
+    assert outputs.rays.shape[0] == 7 * 3
+    assert torch.equal(outputs.rays.get("wavelength").unique(), torch.tensor([400., 550., 700.]))
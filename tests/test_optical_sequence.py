@@ -0,0 +1,141 @@
+import torch
+import torchlensmaker as tlm
+
+
+def test_prefix_cache(lens_system):
+    optics = lens_system()
+    lens, gap = optics[2], optics[3]
+    for p in lens.parameters():
+        p.requires_grad_(False)
+
+    sampling = {"rays": 10}
+    expected = optics(tlm.default_input, sampling).loss
+
+    optics.enable_cache()
+    first = optics(tlm.default_input, sampling)
+    second = optics(tlm.default_input, sampling)
+
+    # Source, gap and frozen lens are cached, the image gap is evaluated each time
+    assert len(optics._prefix_cache) == 3
+    assert torch.allclose(first.loss, expected)
+    assert torch.allclose(second.loss, expected)
+
+    second.loss.backward()
+    assert gap.offset.grad is not None
+
+    # Modifying a cached element invalidates it and all following elements
+    with torch.no_grad():
+        lens.shape_a.add_(0.01)
+    third = optics(tlm.default_input, sampling)
+    assert not torch.allclose(third.loss, expected)
+
+    # Hooks bypass the cache
+    execute_list, _ = tlm.full_forward(optics, tlm.default_input, sampling)
+    assert len(execute_list) > 5
+
+
+def test_prefix_cache_shapes():
+    b = torch.tensor(0.02)
+    surface = tlm.RefractiveSurface(tlm.Parabola(height=15., a=b), (1.0, 1.5))
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=10.),
+        tlm.Gap(5.),
+        surface,
+        tlm.Gap(tlm.Parameter(torch.tensor(20.))),
+        tlm.FocalPoint(),
+    ).enable_cache()
+    sampling = {"rays": 10}
+
+    def uncached():
+        return tlm.OpticalSequence(*optics)(tlm.default_input, sampling).loss
+
+    optics(tlm.default_input, sampling)
+
+    # In place writes to shape tensors that are not parameters
+    b.add_(0.05)
+    assert torch.allclose(optics(tlm.default_input, sampling).loss, uncached())
+
+    # Shapes replaced on an element
+    surface.shape = tlm.Parabola(height=15., a=0.)
+    assert torch.allclose(optics(tlm.default_input, sampling).loss, uncached())
+
+
+def test_freeze(lens_system):
+    optics = lens_system()
+    lens, gap = optics[2], optics[3]
+
+    # Parameters made non trainable by the user stay that way after unfreezing
+    source_param = tlm.Parameter(torch.tensor(10.), requires_grad=False)
+    optics[0].beam_diameter = source_param
+
+    tlm.freeze(optics[0])
+    tlm.freeze(lens)
+
+    assert all(not p.requires_grad for p in lens.parameters())
+
+    output = optics(tlm.default_input, {"rays": 10})
+    output.loss.backward()
+
+    assert gap.offset.grad is not None
+    assert all(p.grad is None for p in lens.parameters())
+
+    tlm.unfreeze(optics)
+    assert all(p.requires_grad for p in lens.parameters())
+    assert not source_param.requires_grad
+
+
+def test_compile_plan(lens_system):
+    optics = lens_system()
+    lens, gap = optics[2], optics[3]
+    sampling = {"rays": 10}
+
+    plan = tlm.compile_plan(optics)
+    assert len(plan.elements) == 7
+
+    expected = optics(tlm.default_input, sampling)
+    output = plan(tlm.default_input, sampling)
+
+    assert torch.allclose(output.loss, expected.loss)
+    assert torch.allclose(output.rays.data, expected.rays.data)
+
+    output.loss.backward()
+    assert gap.offset.grad is not None
+    assert all(p.grad is not None for p in lens.parameters())
+
+    # Half pupil sampling is turned off for decentered systems, like the stack does
+    decentered = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=10.),
+        tlm.Gap(5.),
+        tlm.RefractiveSurface(tlm.Parabola(height=15., a=0.02), (1.0, 1.5), decenter=0.5),
+        tlm.Gap(20.),
+        tlm.FocalPoint(),
+    )
+    sampling = {"rays": 10, "symmetry": True}
+    expected = decentered(tlm.default_input, sampling)
+    output = tlm.compile_plan(decentered)(tlm.default_input, sampling)
+    assert output.rays.shape[0] == expected.rays.shape[0] == 10
+    assert torch.allclose(output.loss, expected.loss)
+
+
+def test_compile_plan_updates(lens_system):
+    optics = lens_system()
+    lens, gap = optics[2], optics[3]
+    sampling = {"rays": 10}
+
+    tlm.freeze(gap)
+    plan = tlm.compile_plan(optics)
+    plan(tlm.default_input, sampling)
+
+    # In place writes to a frozen gap are seen by the plan
+    with torch.no_grad():
+        gap.offset.copy_(torch.tensor(25.))
+    assert torch.allclose(plan(tlm.default_input, sampling).loss, optics(tlm.default_input, sampling).loss)
+
+    # Constant offsets replaced after compilation too
+    optics[1].offset = 8.
+    assert torch.allclose(plan(tlm.default_input, sampling).target, optics(tlm.default_input, sampling).target)
+
+    # Unfreezing after compilation makes the element differentiable again
+    tlm.unfreeze(gap)
+    plan(tlm.default_input, sampling).loss.backward()
+    assert gap.offset.grad is not None
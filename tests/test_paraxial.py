@@ -0,0 +1,99 @@
+import torch
+import torchlensmaker as tlm
+
+
+def test_thick_lens():
+    n = 1.5
+    a = 0.01
+    thickness = 2.0
+    shape = tlm.Parabola(height=10., a=a)
+
+    lens = tlm.SymmetricLens(shape, (1.0, n), inner_thickness=thickness)
+    optics = tlm.OpticalSequence(tlm.Gap(5.), lens)
+
+    system = tlm.paraxial(optics)
+
+    # Lensmaker's equation
+    c1, c2 = 2*a, -2*a
+    power = (n - 1) * (c1 - c2 + (n - 1) * thickness * c1 * c2 / n)
+
+    assert torch.allclose(system.power, torch.tensor(power))
+    assert torch.allclose(system.x_first, torch.tensor(5.))
+    assert torch.allclose(system.x_last, torch.tensor(5. + thickness))
+
+    # Symmetric lens: principal planes are symmetric around the center
+    center = 5. + thickness / 2
+    assert torch.allclose(system.front_principal_plane - center, center - system.rear_principal_plane, atol=1e-5)
+
+    # Focal points are one focal length away from principal planes
+    assert torch.allclose(system.rear_focal_point - system.rear_principal_plane, system.efl, atol=1e-4)
+    assert torch.allclose(system.front_principal_plane - system.front_focal_point, system.efl, atol=1e-4)
+
+
+def test_parabolic_mirror():
+    a = -0.001
+    optics = tlm.OpticalSequence(
+        tlm.Gap(10.),
+        tlm.ReflectiveSurface(tlm.Parabola(height=30., a=a)),
+    )
+
+    system = tlm.paraxial(optics)
+
+    # Focus of the parabola x = ay^2 is at 1/(4a)
+    assert torch.allclose(system.rear_focal_point, torch.tensor(10. + 1/(4*a)))
+    assert torch.allclose(system.efl, torch.tensor(-1/(4*a)))
+
+
+def test_f_number():
+    optics = tlm.OpticalSequence(
+        tlm.Aperture(height=30, diameter=10.),
+        tlm.Gap(1.),
+        tlm.RefractiveSurface(tlm.CircularArc(height=20., r=50.), (1.0, 1.5)),
+        tlm.Gap(1.),
+        tlm.RefractiveSurface(tlm.Line(20.), (1.5, 1.0)),
+    )
+
+    system = tlm.paraxial(optics)
+
+    assert torch.allclose(system.entrance_pupil, torch.tensor(10.))
+    assert torch.allclose(system.f_number, torch.abs(system.efl) / 10.)
+
+
+def test_differentiable():
+    shape = tlm.CircularArc(height=20., r=tlm.Parameter(torch.tensor(40.)))
+    lens = tlm.PlanoLens(shape, (1.0, 1.5), inner_thickness=1.)
+
+    system = tlm.paraxial(lens)
+    system.efl.backward()
+
+    assert torch.isfinite(shape.parameters()["K"].grad)
+
+
+def test_seidel_parabolic_mirror():
+    # A parabolic mirror has no spherical aberration, a spherical mirror does
+    c, y = -0.002, 10.
+
+    parabola = tlm.OpticalSequence(tlm.ReflectiveSurface(tlm.Parabola(height=30., a=c/2)))
+    sphere = tlm.OpticalSequence(tlm.ReflectiveSurface(tlm.CircularArc(height=30., r=1/c)))
+
+    S_parabola = tlm.seidel(parabola, field_angle=1., pupil_radius=y)
+    S_sphere = tlm.seidel(sphere, field_angle=1., pupil_radius=y)
+
+    assert torch.allclose(S_parabola.spherical, torch.tensor(0.), atol=1e-6)
+    assert torch.allclose(S_sphere.spherical, torch.tensor(-2 * c**3 * y**4), rtol=1e-4)
+
+    # Away from spherical aberration, both mirrors are the same to third order
+    assert torch.allclose(S_parabola.petzval, S_sphere.petzval)
+
+
+def test_seidel_differentiable():
+    shape = tlm.Parabola(height=20., a=tlm.Parameter(torch.tensor(0.01)))
+    lens = tlm.SymmetricLens(shape, (1.0, 1.5), inner_thickness=1.)
+
+    optics = tlm.OpticalSequence(lens, tlm.Gap(5.), tlm.Aperture(height=20., diameter=5.))
+
+    S = tlm.seidel(optics, field_angle=5.)
+    S.total.pow(2).sum().backward()
+
+    assert S.surfaces.shape == (2, 5)
+    assert torch.isfinite(shape.parameters()["a"].grad)
@@ -0,0 +1,82 @@
+import math
+import torch
+import torchlensmaker as tlm
+
+from torchlensmaker.raytracing import (
+    reflection,
+    refraction,
+    fused_reflection,
+    fused_refraction,
+    FusedReflection,
+    FusedRefraction,
+)
+
+
+def random_rays(N, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    angles = (torch.rand(N, generator=generator, dtype=torch.float64) - 0.5) * math.pi / 2
+    normal_angles = math.pi + (torch.rand(N, generator=generator, dtype=torch.float64) - 0.5) * math.pi / 2
+    rays = torch.column_stack((torch.cos(angles), torch.sin(angles)))
+    normals = torch.column_stack((torch.cos(normal_angles), torch.sin(normal_angles)))
+    return rays, normals
+
+
+def test_fused_reflection():
+    rays, normals = random_rays(20)
+    rays.requires_grad_(True)
+    normals.requires_grad_(True)
+
+    assert torch.allclose(fused_reflection(rays, normals), reflection(rays, normals))
+    assert torch.autograd.gradcheck(FusedReflection.apply, (rays, normals))
+    assert torch.autograd.gradcheck(FusedReflection.apply, (rays, normals), check_forward_ad=True, check_backward_ad=False, check_undefined_grad=False)
+
+
+def test_fused_refraction():
+    # Indices ratio below one so that no ray is beyond the critical angle
+    rays, normals = random_rays(20)
+    eta = torch.full((20, 1), 1 / 1.5, dtype=torch.float64, requires_grad=True)
+    rays.requires_grad_(True)
+    normals.requires_grad_(True)
+
+    expected = refraction(rays, normals, 1.0, 1.5, critical_angle="clamp")
+    assert torch.allclose(fused_refraction(rays, normals, 1.0, 1.5), expected)
+
+    assert torch.autograd.gradcheck(FusedRefraction.apply, (rays, normals, eta))
+    assert torch.autograd.gradcheck(FusedRefraction.apply, (rays, normals, eta), check_forward_ad=True, check_backward_ad=False, check_undefined_grad=False)
+
+    # Scalar ratio of indices
+    scalar_eta = torch.tensor(1 / 1.5, dtype=torch.float64, requires_grad=True)
+    assert torch.autograd.gradcheck(FusedRefraction.apply, (rays, normals, scalar_eta))
+
+
+def test_fused_refraction_clamped():
+    # Beyond the critical angle, all rays refract at 90 degrees
+    rays, normals = random_rays(20, seed=1)
+    assert torch.allclose(
+        fused_refraction(rays, normals, 1.5, 1.0),
+        refraction(rays, normals, 1.5, 1.0, critical_angle="clamp"),
+    )
+
+
+def test_fused_sampling():
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=10.),
+        tlm.Gap(5.),
+        tlm.SymmetricLens(tlm.Parabola(height=15., a=tlm.Parameter(torch.tensor(0.02))), (1.0, 1.5), outer_thickness=1.0),
+        tlm.Gap(5.),
+        tlm.ReflectiveSurface(tlm.Parabola(height=30., a=tlm.Parameter(torch.tensor(-0.01)))),
+        tlm.Gap(-10.),
+        tlm.FocalPoint(),
+    )
+
+    # Fused kernels are opt in, and give the same trace and gradients
+    grads = []
+    for fused in (False, True):
+        optics.zero_grad()
+        loss = optics(tlm.default_input, {"rays": 10, "fused": fused}).loss
+        loss.backward()
+        grads.append((loss.detach(), [p.grad.clone() for p in optics.parameters()]))
+
+    (loss, expected), (fused_loss, fused_grads) = grads
+    assert torch.allclose(loss, fused_loss)
+    assert all(torch.allclose(g, e, atol=1e-6) for g, e in zip(fused_grads, expected))
@@ -0,0 +1,84 @@
+import torch
+import torchlensmaker as tlm
+
+
+def test_recorder_matches_full_forward(lens_system):
+    optics = lens_system(aperture=5.)
+    sampling = {"rays": 20}
+
+    recorder = tlm.TraceRecorder(optics)
+    outputs = recorder.trace(tlm.default_input, sampling)
+
+    execute_list, expected = tlm.full_forward(optics, tlm.default_input, sampling)
+    leaves = [ctx for ctx in execute_list if ctx.module in tlm.flatten_sequence(optics)]
+
+    assert len(recorder.stages) == len(leaves)
+    for stage, ctx in zip(recorder.stages, leaves):
+        assert stage.module is ctx.module
+        assert torch.allclose(stage.outputs.rays.data, ctx.outputs.rays.get(["RX", "RY", "VX", "VY"]))
+        assert torch.allclose(stage.outputs.target, ctx.outputs.target)
+
+    assert torch.allclose(outputs.loss, expected.loss)
+    recorder.remove()
+
+
+def test_recorder_reused_element():
+    lens = tlm.SymmetricLens(tlm.Parabola(height=15., a=0.02), (1.0, 1.5), outer_thickness=1.0)
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=10.),
+        tlm.Gap(5.),
+        lens,
+        tlm.Gap(5.),
+        lens,
+        tlm.Gap(20.),
+        tlm.FocalPoint(),
+    )
+
+    recorder = tlm.TraceRecorder(optics)
+    recorder.trace(tlm.default_input, {"rays": 10})
+
+    # One stage per use of each element
+    elements = tlm.flatten_sequence(optics)
+    assert len(recorder.stages) == len(elements)
+    assert all(stage.module is element for stage, element in zip(recorder.stages, elements))
+    recorder.remove()
+
+
+def test_recorder_decimation(lens_system):
+    optics = lens_system(aperture=5.)
+    recorder = tlm.TraceRecorder(optics, columns=["RX", "RY"], max_rays=5)
+
+    recorder.trace(tlm.default_input, {"rays": 20})
+    first = recorder.stages[0].outputs.rays.data.clone()
+    assert first.shape == (5, 2)
+
+    # Blocked masks are restricted to the recorded rays
+    aperture = recorder.stages[2]
+    assert aperture.outputs.blocked.shape[0] == 5
+    assert aperture.outputs.rays.shape[0] == (~aperture.outputs.blocked).sum()
+
+    # Buffers are reused, outside of recording hooks do nothing
+    optics(tlm.default_input, {"rays": 20})
+    assert torch.equal(recorder.stages[0].outputs.rays.data, first)
+    recorder.remove()
+
+
+def test_profiler(lens_system):
+    optics = lens_system(aperture=5.)
+
+    with tlm.Profiler(optics) as profiler:
+        loss = optics(tlm.default_input, {"rays": 20}).loss
+        loss.backward()
+
+    summary = profiler.summary()
+    assert len(summary) == 9
+    assert all(p.calls == 1 for p in summary)
+
+    source, aperture = summary[0], summary[2]
+    assert source.rays_in == 0 and source.rays_out == 20
+    assert aperture.rays_in == 20 and aperture.rays_out == 20 - aperture.blocked
+    assert len(profiler.table().splitlines()) == 11
+
+    # Hooks are removed on exit
+    optics(tlm.default_input, {"rays": 20})
+    assert source.calls == 1
@@ -0,0 +1,26 @@
+import torch
+import torchlensmaker as tlm
+
+from torchlensmaker.sensitivity import substitute_parameters
+
+
+def test_jacobian_matches_reverse_mode(lens_system):
+    optics = lens_system()
+    sampling = {"rays": 10}
+    params = list(optics.named_parameters())
+
+    def forward(*tensors):
+        with substitute_parameters(optics, {p: t for (_, p), t in zip(params, tensors)}):
+            return optics(tlm.default_input, sampling).rays.get("RY")
+
+    expected = torch.autograd.functional.jacobian(forward, tuple(p.detach() for _, p in params))
+
+    for vectorize in (None, True, False):
+        sensitivity = tlm.jacobian(optics, sampling, output="RY", vectorize=vectorize)
+        for (name, _), block in zip(params, expected):
+            assert torch.allclose(sensitivity.jacobian[name], block, rtol=1e-4, atol=1e-6)
+
+    # Scalar loss with scalar parameters
+    sensitivity = tlm.jacobian(optics, sampling, vectorize=False)
+    assert sensitivity.jacobian["3.offset"].shape == ()
+    assert sensitivity.ranking()[0] == "2.shape_a"
@@ -0,0 +1,47 @@
+import copy
+import pickle
+import torch
+import torchlensmaker as tlm
+
+
+def loss(optics):
+    with torch.no_grad():
+        return optics(tlm.default_input, {"rays": 10}).loss
+
+
+def test_pickle_and_copy(config):
+    optics, _ = tlm.build_system(config)
+
+    for other in (pickle.loads(pickle.dumps(optics)), copy.deepcopy(optics)):
+        assert torch.allclose(loss(other), loss(optics))
+
+        # Shapes still reference the registered parameters
+        with torch.no_grad():
+            other.lens.shape_a.fill_(0.03)
+        assert other.lens.shape.parameters()["a"] is other.lens.shape_a
+        assert not torch.allclose(loss(other), loss(optics))
+
+
+def test_save_load(config, tmp_path):
+    optics, _ = tlm.build_system(config)
+    with torch.no_grad():
+        optics.lens.shape_a.fill_(0.025)
+
+    tlm.save_system(optics, tmp_path / "system.pt")
+    loaded = tlm.load_system(tmp_path / "system.pt")
+    assert torch.allclose(loss(loaded), loss(optics))
+
+    # Loading into a rebuilt system
+    rebuilt, _ = tlm.build_system(config)
+    tlm.load_system(tmp_path / "system.pt", rebuilt)
+    assert torch.equal(rebuilt.lens.shape_a, optics.lens.shape_a)
+
+
+def test_system_pool(config):
+    optics, sampling = tlm.build_system(config)
+    candidates = torch.tensor([[0.02, 20.0], [0.025, 25.0], [0.03, 30.0]], dtype=torch.float64)
+    params = tlm.evolution.select_parameters(optics, ["lens.shape_a", "3.offset"])
+    expected = tlm.evolution.evaluate_population(optics, sampling, params, candidates)
+
+    with tlm.SystemPool(optics, sampling, ["lens.shape_a", "3.offset"], workers=2) as pool:
+        assert torch.allclose(pool.evaluate(candidates), expected)
@@ -0,0 +1,128 @@
+import torch
+import torchlensmaker as tlm
+
+from torchlensmaker.tensorframe import TensorFrame
+from torchlensmaker.optics import OpticalData
+
+
+def make_outputs(RY, VY, object_coords):
+    N = RY.shape[0]
+    VX = torch.ones(N)
+    norm = torch.sqrt(VX**2 + VY**2)
+    rays = TensorFrame(
+        torch.column_stack((torch.zeros(N), RY, VX / norm, VY / norm, object_coords)),
+        columns=["RX", "RY", "VX", "VY", "object"],
+    )
+    return OpticalData(rays, torch.tensor([10., 0.]), None, torch.tensor(0.))
+
+
+def test_spot_metrics_per_field():
+    # Two fields: one perfectly focused at y=1, one spread over [-1, 1] around y=3
+    RY = torch.tensor([0., 1., 2., 3., 3., 3.])
+    VY = torch.tensor([0.1, 0., -0.1, -0.1, 0., 0.1])
+    outputs = make_outputs(RY, VY, torch.tensor([0., 0., 0., 1., 1., 1.]))
+
+    spots = tlm.spot_diagram(outputs)
+
+    assert spots.columns == ["object"]
+    assert torch.allclose(spots.centroid, torch.tensor([1., 3.]), atol=1e-6)
+    assert torch.allclose(spots.rms, torch.tensor([0., (2 / 3) ** 0.5]), atol=1e-6)
+    assert torch.allclose(spots.radius, torch.tensor([0., 1.]), atol=1e-6)
+
+    # All energy is enclosed at the largest radius
+    assert torch.allclose(spots.encircled_energy[:, -1], torch.ones(2))
+
+
+def test_through_focus_closed_form():
+    # Rays of field 0 cross at (5, 1), rays of field 1 cross at (7, -2)
+    slopes = torch.tensor([-0.2, -0.1, 0., 0.1, 0.2])
+    RY = torch.cat((1 - 5 * slopes, -2 - 7 * slopes))
+    VY = torch.cat((slopes, slopes))
+    outputs = make_outputs(RY, VY, torch.cat((torch.zeros(5), torch.ones(5))))
+
+    focus = tlm.through_focus(outputs, positions=torch.tensor([5., 6., 7.]))
+
+    assert torch.allclose(focus.group_best_focus, torch.tensor([5., 7.]), atol=1e-5)
+    assert torch.allclose(focus.best_focus, torch.tensor(6.), atol=1e-5)
+    assert torch.allclose(focus.rms[0, 0], torch.tensor(0.), atol=1e-5)
+    assert torch.allclose(focus.rms[1, 2], torch.tensor(0.), atol=1e-5)
+
+    # Closed form agrees with intersecting rays with the plane
+    spots = tlm.spot_diagram(outputs, x=6.)
+    assert torch.allclose(focus.rms[:, 1], spots.rms, atol=1e-5)
+
+
+def test_geometric_mtf():
+    # Uniform spread of width 1: the MTF is |sinc(f)|
+    N = 1001
+    RY = torch.linspace(-0.5, 0.5, N)
+    outputs = make_outputs(RY, torch.zeros(N), torch.zeros(N))
+
+    mtf = tlm.geometric_mtf(outputs, num_bins=512, half_width=2.)
+    assert torch.allclose(mtf.mtf[0, 0], torch.tensor(1.))
+
+    f = torch.tensor([0.25, 0.5])
+    assert torch.allclose(mtf.at(f)[0], torch.abs(torch.sinc(f)), atol=1e-2)
+
+    # Kernel binning is differentiable with respect to ray positions
+    RY.requires_grad_(True)
+    outputs = make_outputs(RY, torch.zeros(N), torch.zeros(N))
+    soft = tlm.geometric_mtf(outputs, num_bins=128, half_width=2., bandwidth=0.05, chunk_size=100)
+    soft.at(torch.tensor([0.5])).sum().backward()
+    assert torch.all(torch.isfinite(RY.grad))
+
+
+def test_half_pupil_symmetry():
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=10.),
+        tlm.Gap(5.),
+        tlm.SymmetricLens(tlm.Parabola(height=15., a=0.02), (1.0, 1.5), outer_thickness=1.0),
+        tlm.Gap(20.),
+        tlm.FocalPoint(),
+    )
+
+    assert tlm.is_axisymmetric(optics)
+
+    for num_rays in (10, 11):
+        full = optics(tlm.default_input, {"rays": num_rays})
+        half = optics(tlm.default_input, {"rays": num_rays, "symmetry": True})
+
+        assert half.rays.shape[0] == (num_rays + 1) // 2
+        assert torch.allclose(half.rays.get("weight").sum(), torch.tensor(float(num_rays)))
+        assert torch.allclose(full.loss, half.loss, atol=1e-5)
+
+        # Metrics relative to the centroid mirror the half pupil
+        full_spots, half_spots = tlm.spot_diagram(full, x=23.), tlm.spot_diagram(half, x=23.)
+        assert torch.allclose(full_spots.centroid, half_spots.centroid, atol=1e-5)
+        assert torch.allclose(full_spots.rms, half_spots.rms, atol=1e-5)
+        assert torch.allclose(tlm.through_focus(full).best_focus, tlm.through_focus(half).best_focus, atol=1e-4)
+        full_mtf = tlm.geometric_mtf(full, x=23., half_width=1.)
+        half_mtf = tlm.geometric_mtf(half, x=23., half_width=1.)
+        assert torch.allclose(full_mtf.mtf, half_mtf.mtf, atol=1e-5)
+
+    # Decentered systems are not halved
+    optics = tlm.OpticalSequence(
+        tlm.PointSourceAtInfinity(beam_diameter=10.),
+        tlm.Gap(5.),
+        tlm.RefractiveSurface(tlm.Parabola(height=15., a=0.02), (1.0, 1.5), decenter=0.5),
+        tlm.Gap(20.),
+        tlm.FocalPoint(),
+    )
+    assert not tlm.is_axisymmetric(optics)
+    half = optics(tlm.default_input, {"rays": 10, "symmetry": True})
+    assert half.rays.shape[0] == 10
+
+
+def test_half_pupil_image():
+    optics = tlm.OpticalSequence(
+        tlm.ObjectAtInfinity(beam_diameter=10., angular_size=4.),
+        tlm.Gap(5.),
+        tlm.SymmetricLens(tlm.Parabola(height=15., a=0.02), (1.0, 1.5), outer_thickness=1.0),
+        tlm.Gap(20.),
+    )
+
+    # The on-axis object point is traced with half the pupil
+    for bandwidth in (None, 0.05):
+        full = tlm.simulate_image(optics, {"rays": 10, "object": 3}, torch.ones_like, 100, 4., bandwidth=bandwidth)
+        half = tlm.simulate_image(optics, {"rays": 10, "object": 3, "symmetry": True}, torch.ones_like, 100, 4., bandwidth=bandwidth)
+        assert torch.allclose(full.intensity, half.intensity, atol=1e-5)
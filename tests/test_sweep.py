@@ -0,0 +1,32 @@
+import os
+import numpy as np
+import torch
+import torchlensmaker as tlm
+
+
+def test_sweep_resume(tmp_path, lens_system):
+    def build(n):
+        return lens_system(n=n), {"rays": 10}
+
+    output_dir = str(tmp_path / "sweep")
+    arguments = {"n": [1.4, 1.5]}
+    parameters = {"3.offset": [15., 20., 25.]}
+
+    results = tlm.sweep(build, output_dir, arguments=arguments, parameters=parameters, shard_size=4)
+
+    assert len(results["loss"]) == 6
+    assert np.allclose(results["n"], [1.4, 1.4, 1.4, 1.5, 1.5, 1.5])
+    assert np.allclose(results["3.offset"], [15., 20., 25.] * 2)
+    assert np.all(np.isfinite(results["loss"]))
+
+    # Same loss as a direct evaluation
+    optics, sampling = build(1.5)
+    with torch.no_grad():
+        optics[3].offset.fill_(20.)
+        expected = optics(tlm.default_input, sampling).loss.item()
+    assert np.isclose(results["loss"][4], expected)
+
+    # Resuming only evaluates missing shards
+    os.remove(os.path.join(output_dir, "shard_00001.npz"))
+    resumed = tlm.sweep(build, output_dir, arguments=arguments, parameters=parameters, shard_size=4)
+    assert np.allclose(resumed["loss"], results["loss"])
@@ -0,0 +1,41 @@
+import math
+import torch
+import torchlensmaker as tlm
+
+from torchlensmaker.tolerancing import ToleranceResult
+
+
+def test_tolerance_seed(lens_system):
+    optics = lens_system()
+    sampling = {"rays": 10}
+    tolerances = {"2.shape_a": tlm.Tolerance(0.1, relative=True), "3.offset": tlm.Tolerance(1.0, "uniform")}
+
+    result1 = tlm.tolerance(optics, sampling, tolerances, num_trials=20, chunk_size=7, seed=0)
+    result2 = tlm.tolerance(optics, sampling, tolerances, num_trials=20, chunk_size=20, seed=0)
+
+    assert torch.equal(result1.perturbations, result2.perturbations)
+    assert torch.equal(result1.losses, result2.losses)
+    assert torch.all(result1.perturbations[:, 1].abs() <= 1.0)
+
+    # Nominal parameters are restored
+    assert optics[3].offset.item() == 20.
+    assert result1.failed().sum() == 0
+    assert result1.perturbation(3)["3.offset"].shape == (1,)
+
+
+def test_tolerance_failures(capsys):
+    losses = torch.tensor([1.0, math.inf, 3.0, math.inf], dtype=torch.float64)
+    result = ToleranceResult(["a"], [1], 1.0, torch.zeros(4, 1, dtype=torch.float64), losses)
+
+    assert result.failed().tolist() == [False, True, False, True]
+    assert result.mean() == 2.0
+    assert result.quantile(0.5).item() == 2.0
+    result.summary()
+    assert "failed: 2" in capsys.readouterr().out
+
+    # All trials failed
+    result = ToleranceResult(["a"], [1], 1.0, torch.zeros(2, 1, dtype=torch.float64), torch.full((2,), math.inf))
+    assert math.isnan(result.mean()) and math.isnan(result.std())
+    assert torch.all(torch.isnan(result.quantile([0.5, 0.9])))
+    result.summary()
+    assert "failed: 2" in capsys.readouterr().out